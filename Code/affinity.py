@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Affinity of every user group to every candidate, from all frequent tokens.
+
+A candidate is a name and a list of aliases; a token refers to a candidate
+when it is one of its aliases, either as is or after a leading '#' or '@':
+'cruz', '#cruz' and '@cruz' all refer to Ted Cruz, but 'wanted' does not
+refer to 'ted'. Handles and hashtags are listed as aliases of their own
+('realdonaldtrump'). Matching whole tokens is one dict lookup per token.
+
+The alias tokens of a candidate are then treated as one token: with M the
+V x C 0/1 matrix of which token refers to which candidate, the mentions
+N^k_c = sum over its tokens of N_t^k are one matrix product. The relative
+popularity log2(N^k_c / N^all_c) of the candidate favours the groups that
+mention everything more, so the affinity of group k is that minus the
+same ratio over all tokens, log2(N^k / N^all): above 0, the group
+mentions the candidate more than its share. The leading group of a
+candidate is the one with the highest affinity, and its margin how far
+ahead of the runner-up it is (in log2 units). A group that mentions none of
+the frequent tokens has no share to compare to: its affinity is NaN and it
+never leads.
+"""
+
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_CANDIDATES = [
+    ('Bernie Sanders', ['bernie', 'sanders', 'berniesanders', 'sensanders']),
+    ('Ted Cruz', ['ted', 'cruz', 'tedcruz']),
+    ('Donald Trump', ['donald', 'trump', 'realdonaldtrump', 'donaldtrump']),
+]
+
+
+def load_candidates(path):
+    """
+    Argument: path -- JSON object of candidate name -> list of aliases
+    Value: list of (candidate, [alias]) in the order of the file
+    """
+    with open(path) as f:
+        candidates = json.load(f, object_pairs_hook=OrderedDict)
+    if not isinstance(candidates, dict) or not all(isinstance(a, list) and a for a in candidates.values()):
+        raise ValueError('%s: expected an object of candidate name -> non-empty list of aliases' % path)
+    return [(name, [alias.lower() for alias in aliases]) for name, aliases in candidates.items()]
+
+
+class AliasMatcher(object):
+    """
+    Whole-token lookup of the aliases of every candidate.
+
+    Argument: candidates -- list of (candidate, [alias])
+    """
+    def __init__(self, candidates):
+        self.aliases = {}
+        for c, (name, aliases) in enumerate(candidates):
+            for alias in aliases:
+                self.aliases.setdefault(alias.lstrip('#@'), set()).add(c)
+
+    def candidates(self, token):
+        """
+        Value: set of the indexes of the candidates token is an alias of
+        """
+        found = self.aliases.get(token)
+        if found is None and token[:1] in ('#', '@'):
+            found = self.aliases.get(token[1:])
+        return found or set()
+
+
+def alias_matrix(matcher, token_names, num_candidates):
+    """
+    Argument: token_names -- the name of every column of a PopularityMatrix
+    Value: V x C int64 array, 1 where a token refers to a candidate
+    """
+    refers = np.zeros((len(token_names), num_candidates), dtype=np.int64)
+    for column, name in enumerate(token_names):
+        for c in matcher.candidates(name):
+            refers[column, c] = 1
+    return refers
+
+
+class CandidateAffinity(object):
+    """
+    Argument: matrix -- PopularityMatrix of the tokens to score
+              names -- dict of token id -> token, for every token of the matrix
+              candidates -- list of (candidate, [alias])
+    """
+    def __init__(self, matrix, names, candidates):
+        self.candidates = [name for name, aliases in candidates]
+        refers = alias_matrix(AliasMatcher(candidates), [names[t] for t in matrix.token_ids.tolist()],
+                              len(candidates))
+        self.tokens = refers.sum(axis=0)
+        self.mentions = np.dot(matrix.counts, refers)
+        total = self.mentions.sum(axis=0).astype(np.float64)
+        group_mentions = matrix.counts.sum(axis=1).astype(np.float64)
+        # Only the groups with any mentions have a share to compare to.
+        self.groups = np.flatnonzero(group_mentions)
+        self.affinity = np.full(self.mentions.shape, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = (group_mentions[self.groups] / group_mentions.sum())[:, None]
+            self.affinity[self.groups] = np.log(self.mentions[self.groups] / total / share) / np.log(2)
+
+    def leaders(self, unassigned_group):
+        """
+        Value: list of (leading group, margin over the runner-up) of every
+               candidate, leaving out unassigned_group and the groups without
+               any mentions; (unassigned_group, None) for candidates no such
+               group mentions. The margin is inf when no other group does.
+        """
+        rows = []
+        groups = [g for g in self.groups.tolist() if g != unassigned_group]
+        for c in range(len(self.candidates)):
+            if not self.tokens[c] or not self.mentions[groups, c].any():
+                rows.append((unassigned_group, None))
+                continue
+            ranked = sorted(groups, key=lambda g: (-self.affinity[g, c], g))
+            runner_up = self.affinity[ranked[1], c] if len(ranked) > 1 else -np.inf
+            rows.append((ranked[0], float(self.affinity[ranked[0], c] - runner_up)))
+        return rows
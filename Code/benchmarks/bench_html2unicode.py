@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Microbenchmark of the single-pass HTML entity decoder against the original
+two-pass decoding, on entity-heavy tweet texts.
+
+Usage: python bench_html2unicode.py [--tweets N] [--repeat R]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from happyfuntokenizing import html2unicode, _html2unicode_twopass
+
+ENTITY_PIECES = [
+    u"&amp;", u"&lt;", u"&gt;", u"&quot;", u"&#8217;", u"&#8230;", u"&#128293;",
+    u"&eacute;", u"&nbsp;", u"Bernie", u"Hillary", u"#DemDebate", u"RT", u"@tedcruz",
+    u"wins", u"debate", u"tonight", u"&lt;3", u"Q&amp;A",
+]
+
+
+def entity_tweets(n, seed=0):
+    rng = random.Random(seed)
+    return [u' '.join(rng.choice(ENTITY_PIECES) for _ in range(rng.randint(8, 25))) for _ in range(n)]
+
+
+def throughput(decode, texts, repeat):
+    """
+    Best of `repeat` passes, in tweets/sec.
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.time()
+        for t in texts:
+            decode(t)
+        best = min(best, time.time() - start)
+    return len(texts) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--tweets', type=int, default=20000, help='number of synthetic tweets')
+    parser.add_argument('--repeat', type=int, default=3, help='timed passes over the tweets per decoder')
+    args = parser.parse_args()
+
+    texts = entity_tweets(args.tweets)
+    mismatches = sum(1 for t in texts if html2unicode(t) != _html2unicode_twopass(t))
+    print 'Checked %d tweets, %d mismatching' % (len(texts), mismatches)
+
+    base = throughput(_html2unicode_twopass, texts, args.repeat)
+    new = throughput(html2unicode, texts, args.repeat)
+    print 'two-pass:    %10.0f tweets/sec' % base
+    print 'single-pass: %10.0f tweets/sec (%.1fx)' % (new, new / base)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Microbenchmark of Tokenizer(preserve_case=False) against FastTokenizer.
+
+Tokenizes the same stream of tweet texts with both, checks that every
+tweet gets the same tokens, and prints the throughput of each.
+
+Usage: python bench_tokenizer.py [--input raw_tweets.json] [--tweets N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from happyfuntokenizing import Tokenizer, FastTokenizer
+from tweet_parser import parse_tweets
+
+SAMPLE_TEXTS = [
+    "RT @realDonaldTrump: Thank you Iowa! #MakeAmericaGreatAgain https://t.co/AbCdEf123",
+    "Bernie Sanders &amp; Hillary Clinton at the #DemDebate tonight... who won? :-)",
+    "@tedcruz I'm with you &#8212; 100% behind you!!! #CruzCrew",
+    "Watching the debate with friends &lt;3 &gt; anything else on TV",
+    "Call 1-800-555-0199 now to volunteer for the campaign \xe2\x80\xa6",
+    "Can't believe what he said about immigrants. Not OK. http://bit.ly/XyZ",
+    "Feel the Bern! :D :D #FeelTheBern #Bernie2016",
+    "Trump: \xe2\x80\x9cWe will build a wall\xe2\x80\x9d \xe2\x80\x94 really?",
+]
+
+
+def sample_stream(n, retweet_ratio=0.6, seed=0):
+    """
+    A deterministic stream of n texts where retweet_ratio of them repeat an
+    earlier text, like retweets do in the real stream.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for i in range(n):
+        if texts and rng.random() < retweet_ratio:
+            texts.append(texts[rng.randrange(len(texts))])
+        else:
+            words = rng.choice(SAMPLE_TEXTS).split(' ')
+            rng.shuffle(words)
+            texts.append(' '.join(words) + ' %d' % i)
+    return texts
+
+
+def throughput(tokenizer, texts):
+    start = time.time()
+    for t in texts:
+        tokenizer.tokenize(t)
+    return len(texts) / (time.time() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--input', help='file of raw tweet JSON lines (default: a synthetic stream)')
+    parser.add_argument('--tweets', type=int, default=50000, help='number of synthetic tweets')
+    args = parser.parse_args()
+
+    if args.input:
+        with open(args.input) as f:
+            texts = [tw.text for tw in parse_tweets(f)]
+    else:
+        texts = sample_stream(args.tweets)
+
+    slow, fast = Tokenizer(preserve_case=False), FastTokenizer()
+    mismatches = sum(1 for t in texts if slow.tokenize(t) != FastTokenizer().tokenize(t))
+    print 'Checked %d tweets, %d mismatching' % (len(texts), mismatches)
+
+    base = throughput(slow, texts)
+    new = throughput(fast, texts)
+    print 'Tokenizer:     %10.0f tweets/sec' % base
+    print 'FastTokenizer: %10.0f tweets/sec (%.1fx)' % (new, new / base)
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
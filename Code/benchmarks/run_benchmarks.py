@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Stage-by-stage benchmark of the analysis pipeline on a synthetic stream.
+
+Generates a deterministic dataset (see synthetic.py), or uses an existing
+input list and partition, then times each stage of the pipeline on its
+own, in memory and without Spark:
+
+    parse          raw JSON lines -> (user_id, text) tweets  (prefilter, parse_tweets)
+    tokenize       tweet texts -> tokens                      (FastTokenizer)
+    tokenize_base  the same with the original Tokenizer
+    aggregate      tokens -> per-user token id sets
+    group_count    per-user sets -> groups x tokens user counts
+    rank           >= min-users filter, top-20 overall and top-k per group
+
+The results go to a JSON report. With --baseline, every stage is compared
+with an earlier report and the run fails if one got slower by more than
+--tolerance.
+
+Usage: python run_benchmarks.py [--tweets N ...] [--report out.json] [--baseline old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import numpy as np
+
+from happyfuntokenizing import Tokenizer, FastTokenizer
+from inputs import list_inputs
+from local_engine import read_lines, group_token_counts
+from token_ids import token_id
+from tweet_parser import parse_tweets, prefilter, json_backend
+from user_partition import PartitionIndex, index_from_pickle
+
+import synthetic
+
+
+class _Count(object):
+    def __init__(self):
+        self.value = 0
+
+    def add(self, n):
+        self.value += n
+
+
+def run_stages(lines, partition_path, num_groups, min_users, top_k):
+    """
+    Run every stage once.
+    Value: list of (stage, seconds, records in, records out)
+    """
+    stages = []
+
+    def timed(name, records_in, fn):
+        start = time.time()
+        out = fn()
+        stages.append((name, time.time() - start, records_in, len(out)))
+        return out
+
+    broken, non_tweets = _Count(), _Count()
+    tweets = timed('parse', len(lines), lambda: list(parse_tweets(prefilter(lines), broken, non_tweets)))
+    fast = FastTokenizer()
+    tokens = timed('tokenize', len(tweets), lambda: [fast.tokenize(tw.text) for tw in tweets])
+    base = Tokenizer(preserve_case=False)
+    timed('tokenize_base', len(tweets), lambda: [base.tokenize(tw.text) for tw in tweets])
+
+    names = {}
+
+    def aggregate():
+        user_sets = {}
+        for tw, words in zip(tweets, tokens):
+            ids = user_sets.setdefault(tw.user_id, set())
+            for t in set(words):
+                i = token_id(t)
+                ids.add(i)
+                names[i] = t
+        return user_sets
+    user_sets = timed('aggregate', len(tweets), aggregate)
+
+    unassigned_group = num_groups - 1
+    index = PartitionIndex.load(index_from_pickle(partition_path), unassigned_group)
+
+    def group_count():
+        users = list(user_sets)
+        groups = index.lookup_many([int(u) for u in users])
+        return group_token_counts([user_sets[u] for u in users], groups, num_groups)
+    matrix = timed('group_count', len(user_sets), group_count)
+
+    def rank():
+        frequent = matrix.frequent(min_users)
+        frequent.top_overall(names, 20)
+        return frequent.top_k(names, top_k)
+    timed('rank', len(matrix), rank)
+    return stages
+
+
+def compare(report, baseline, tolerance):
+    """
+    Value: list of (stage, old seconds, new seconds) that slowed down by more than tolerance
+    """
+    regressions = []
+    for name, stage in report['stages'].items():
+        old = baseline.get('stages', {}).get(name)
+        if old and stage['seconds'] > old['seconds'] * (1 + tolerance):
+            regressions.append((name, old['seconds'], stage['seconds']))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time each stage of the pipeline on a synthetic tweet stream.')
+    parser.add_argument('--input', help='existing file listing tweet files (default: generate a synthetic dataset)')
+    parser.add_argument('--partition', help='users-partition pickle of the existing input')
+    parser.add_argument('--num-groups', type=int, default=8)
+    parser.add_argument('--min-users', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=3, help='runs of every stage; the fastest counts')
+    parser.add_argument('--report', default='benchmark_report.json', help='JSON report to write')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed slowdown per stage against the baseline (0.2 = 20%%)')
+    synthetic.add_options(parser)
+    args = parser.parse_args()
+
+    data_dir = None
+    if args.input:
+        if not args.partition:
+            parser.error('--input needs --partition')
+        input_path, partition_path = args.input, args.partition
+        config = {'input': args.input}
+    else:
+        data_dir = tempfile.mkdtemp(prefix='tweets-bench-')
+        options = synthetic.dataset_options(args)
+        input_path, partition_path = synthetic.write_dataset(data_dir, **options)
+        config = {'synthetic': options}
+    config.update(num_groups=args.num_groups, min_users=args.min_users, top_k=args.top_k, repeat=args.repeat)
+
+    try:
+        lines = list(read_lines(list_inputs(input_path)))
+        runs = [run_stages(lines, partition_path, args.num_groups, args.min_users, args.top_k)
+                for _ in range(args.repeat)]
+    finally:
+        if data_dir:
+            shutil.rmtree(data_dir)
+
+    stages = {}
+    order = []
+    for run in runs:
+        for name, seconds, records_in, records_out in run:
+            if name not in stages:
+                order.append(name)
+            if name not in stages or seconds < stages[name]['seconds']:
+                stages[name] = {'seconds': seconds, 'records_in': records_in, 'records_out': records_out,
+                                'records_per_sec': records_in / seconds if seconds > 0 else None}
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'json_backend': json_backend,
+        'config': config,
+        'stages': stages,
+    }
+    with open(args.report, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+    print '%-14s %10s %12s %12s %14s' % ('stage', 'seconds', 'records in', 'records out', 'records/sec')
+    for name in order:
+        s = stages[name]
+        print '%-14s %10.3f %12d %12d %14.0f' % (name, s['seconds'], s['records_in'], s['records_out'],
+                                                 s['records_per_sec'] or 0)
+    print 'Report written to %s' % args.report
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, old, new in regressions:
+            print 'REGRESSION %s: %.3fs -> %.3fs' % (name, old, new)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Deterministic synthetic tweet stream, for benchmarks and local testing.
+
+Writes JSON lines shaped like the Streaming API output (tweets with user,
+created_at, entities and retweeted_status, plus limit notices and broken
+lines) and a matching users-partition pickle. Everything is driven by a
+seeded random generator, so the same options always give the same files.
+
+Usage: python synthetic.py --output ../../Data/synthetic [--tweets N] [--users N] ...
+"""
+
+import argparse
+import bisect
+import json
+import os
+import pickle
+import random
+import time
+
+WORDS = (
+    "the to a is in of and for on you this that it be at are will not he i with "
+    "trump donald bernie sanders hillary clinton cruz ted rubio debate vote win "
+    "great sad wall jobs america people tonight president campaign iowa poll "
+    "win lose rally voters media crowd speech fake win news economy"
+).split()
+HASHTAGS = ["DemDebate", "GOPDebate", "FeelTheBern", "MakeAmericaGreatAgain", "CruzCrew",
+            "ImWithHer", "Iowa", "Election2016", "Trump2016", "Bernie2016"]
+DOMAINS = ["t.co", "bit.ly", "nyti.ms", "cnn.it", "fxn.ws", "wapo.st"]
+EMOTICONS = [":)", ":(", ":D", ";)", ":-P"]
+HTML_ENTITIES = ["&amp;", "&lt;3", "&gt;", "&quot;"]
+START = 1454284800  # Mon Feb 01 00:00:00 +0000 2016
+
+
+def created_at(timestamp):
+    return time.strftime('%a %b %d %H:%M:%S +0000 %Y', time.gmtime(timestamp))
+
+
+class TweetStream(object):
+    """
+    Argument: users -- number of distinct users
+              skew -- Zipf exponent of tweets per user (0 = uniform)
+              retweet_ratio -- fraction of tweets that retweet an earlier tweet
+              broken_rate, limit_rate -- fractions of broken lines and limit notices
+              entity_density -- expected hashtags/mentions/urls per tweet
+              seconds_per_tweet -- spacing of created_at
+    """
+    def __init__(self, users=2000, skew=1.1, retweet_ratio=0.4, broken_rate=0.01,
+                 limit_rate=0.02, entity_density=1.0, seconds_per_tweet=5, seed=0):
+        self.rng = random.Random(seed)
+        self.user_ids = [str(10000000 + 7919 * i) for i in range(users)]
+        weights = [1.0 / (i + 1) ** skew for i in range(users)]
+        total = sum(weights)
+        self.cumulative = []
+        acc = 0.0
+        for w in weights:
+            acc += w / total
+            self.cumulative.append(acc)
+        self.retweet_ratio = retweet_ratio
+        self.broken_rate = broken_rate
+        self.limit_rate = limit_rate
+        self.entity_density = entity_density
+        self.seconds_per_tweet = seconds_per_tweet
+        self.originals = []
+        self.next_id = 700000000000000000
+
+    def user(self):
+        i = min(bisect.bisect_left(self.cumulative, self.rng.random()), len(self.user_ids) - 1)
+        return {"id_str": self.user_ids[i], "screen_name": "user%d" % i}
+
+    def original(self, user, timestamp):
+        rng = self.rng
+        words = [rng.choice(WORDS) for _ in range(rng.randint(4, 16))]
+        entities = {"hashtags": [], "user_mentions": [], "urls": []}
+        for _ in range(int(rng.expovariate(1.0 / self.entity_density)) if self.entity_density > 0 else 0):
+            kind = rng.randint(0, 2)
+            if kind == 0:
+                tag = rng.choice(HASHTAGS)
+                entities["hashtags"].append({"text": tag})
+                words.insert(rng.randint(0, len(words)), "#" + tag)
+            elif kind == 1:
+                name = "user%d" % rng.randrange(len(self.user_ids))
+                entities["user_mentions"].append({"screen_name": name})
+                words.insert(rng.randint(0, len(words)), "@" + name)
+            else:
+                url = "https://%s/%x" % (rng.choice(DOMAINS), rng.getrandbits(32))
+                entities["urls"].append({"url": url, "expanded_url": url})
+                words.append(url)
+        if rng.random() < 0.1:
+            words.insert(rng.randint(0, len(words)), rng.choice(EMOTICONS))
+        if rng.random() < 0.1:
+            words.insert(rng.randint(0, len(words)), rng.choice(HTML_ENTITIES))
+        if rng.random() < 0.05:
+            words.append(u"…")
+        self.next_id += rng.randint(1, 1000)
+        return {"created_at": created_at(timestamp), "id_str": str(self.next_id), "user": user,
+                "text": u" ".join(words), "entities": entities}
+
+    def lines(self, n):
+        """
+        Value: generator of n raw JSON lines
+        """
+        rng = self.rng
+        for k in range(n):
+            r = rng.random()
+            if r < self.broken_rate:
+                yield '{"created_at":"Mon Feb 01 00:00:00 +0000 2016","text":"trunc'
+                continue
+            if r < self.broken_rate + self.limit_rate:
+                yield json.dumps({"limit": {"track": rng.randint(1, 500), "timestamp_ms": str(k)}})
+                continue
+            user = self.user()
+            timestamp = START + k * self.seconds_per_tweet
+            if self.originals and rng.random() < self.retweet_ratio:
+                # Popular tweets get retweeted more: prefer recent originals.
+                source = self.originals[-1 - min(int(rng.expovariate(0.05)), len(self.originals) - 1)]
+                tweet = {"created_at": created_at(timestamp), "id_str": str(self.next_id + 1), "user": user,
+                         "text": (u"RT @%s: %s" % (source["user"]["screen_name"], source["text"]))[:140],
+                         "entities": source["entities"], "retweeted_status": source}
+                self.next_id += 1
+            else:
+                tweet = self.original(user, timestamp)
+                self.originals.append(tweet)
+                if len(self.originals) > 1000:
+                    del self.originals[:500]
+            yield json.dumps(tweet)
+
+    def partition(self, coverage=0.8, groups=7):
+        """
+        Value: {user_id: partition_id} covering a fraction of the users
+        """
+        rng = random.Random(len(self.user_ids))
+        return dict((u, rng.randrange(groups)) for u in self.user_ids if rng.random() < coverage)
+
+
+def write_dataset(directory, tweets=100000, files=4, coverage=0.8, **options):
+    """
+    Write `files` tweet files, an input list and a users-partition pickle
+    into `directory`.
+    Value: (path of the input list, path of the partition pickle)
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    stream = TweetStream(**options)
+    paths = []
+    lines = stream.lines(tweets)
+    for i in range(files):
+        path = os.path.abspath(os.path.join(directory, 'tweets-%03d.json' % i))
+        with open(path, 'w') as f:
+            for _ in range(tweets // files + (1 if i < tweets % files else 0)):
+                f.write(next(lines) + '\n')
+        paths.append(path)
+    input_path = os.path.join(directory, 'data_input.txt')
+    with open(input_path, 'w') as f:
+        f.write('\n'.join(paths) + '\n')
+    partition_path = os.path.join(directory, 'users-partition.pickle')
+    with open(partition_path, 'wb') as f:
+        pickle.dump(stream.partition(coverage), f)
+    return input_path, partition_path
+
+
+def add_options(parser):
+    parser.add_argument('--tweets', type=int, default=100000, help='number of lines')
+    parser.add_argument('--files', type=int, default=4, help='number of tweet files')
+    parser.add_argument('--users', type=int, default=2000, help='number of distinct users')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent of tweets per user')
+    parser.add_argument('--retweet-ratio', type=float, default=0.4, help='fraction of retweets')
+    parser.add_argument('--broken-rate', type=float, default=0.01, help='fraction of broken lines')
+    parser.add_argument('--limit-rate', type=float, default=0.02, help='fraction of limit notices')
+    parser.add_argument('--entity-density', type=float, default=1.0,
+                        help='expected hashtags, mentions and urls per tweet')
+    parser.add_argument('--coverage', type=float, default=0.8,
+                        help='fraction of users in the users partition')
+    parser.add_argument('--seed', type=int, default=0, help='random seed')
+
+
+def dataset_options(args):
+    return dict(tweets=args.tweets, files=args.files, coverage=args.coverage, users=args.users,
+                skew=args.skew, retweet_ratio=args.retweet_ratio, broken_rate=args.broken_rate,
+                limit_rate=args.limit_rate, entity_density=args.entity_density, seed=args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic tweet stream and users partition.')
+    parser.add_argument('--output', required=True, help='directory to write the dataset to')
+    add_options(parser)
+    args = parser.parse_args()
+    input_path, partition_path = write_dataset(args.output, **dataset_options(args))
+    print 'Wrote %s and %s' % (input_path, partition_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Content-addressed checkpoints of the expensive intermediates.
+
+A run with --checkpoint-dir keeps, under a directory named after a hash of
+everything its results depend on (the input files, the users partition,
+the tokenizer version and the settings that change the counts):
+
+    summary       the counts printed by Parts 0 to 2, the heavy posters and, with
+                  --dedup-retweets, the broadcast retweets (see retweets.py)
+    user_tokens   ((user_id, bucket), [token id]) of every user (see skew.py)
+    token_counts  (token id, [users per group]) of every token
+    token_names   (token id, token) of every token
+
+Each dataset is written with saveAsPickleFile and only counts as complete
+once Spark has written its _SUCCESS marker, so a job that crashed resumes
+from the last dataset it finished. A later run with other thresholds, top-k
+or candidate keywords finds all of them and re-parses nothing.
+"""
+
+import hashlib
+import os
+
+import happyfuntokenizing
+
+# Bumped whenever the layout of the checkpointed datasets changes.
+CHECKPOINT_FORMAT = 2
+
+
+def _file_digest(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def checkpoint_key(input_files, partition_path, settings):
+    """
+    Argument: input_files -- the tweet files (or dataset) read by the run
+              partition_path -- the users-partition pickle
+              settings -- sequence of the other options the counts depend on
+    Value: hex digest naming the checkpoints of this run
+
+    Input files are identified by path, size and modification time (local
+    files) or path alone (other file systems), so they are not read here;
+    the partition file is small and hashed by content.
+    """
+    md5 = hashlib.md5()
+    md5.update('format %d\n' % CHECKPOINT_FORMAT)
+    md5.update('tokenizer %d\n' % happyfuntokenizing.TOKENIZER_VERSION)
+    for path in input_files:
+        if os.path.exists(path):
+            st = os.stat(path)
+            md5.update('input %s %d %d\n' % (os.path.abspath(path), st.st_size, int(st.st_mtime)))
+        else:
+            md5.update('input %s\n' % path)
+    md5.update('partition %s\n' % _file_digest(partition_path))
+    for value in settings:
+        md5.update('setting %r\n' % (value,))
+    return md5.hexdigest()
+
+
+class Checkpoints(object):
+    """
+    Argument: sc -- the SparkContext
+              directory -- root of the checkpoints, on any Hadoop file system,
+                           or None to compute everything and save nothing
+              key -- checkpoint_key of this run
+    """
+    def __init__(self, sc, directory, key):
+        self.sc = sc
+        self.enabled = directory is not None
+        self.path = directory.rstrip('/') + '/' + key if self.enabled else None
+        self.summary = {}
+        self.resumed = []
+        # Whether the summary holds values that are not saved yet.
+        self.changed = False
+        if self._complete('summary'):
+            self.summary = sc.pickleFile(self._dataset('summary')).first()
+            self.resumed.append('summary')
+
+    def _dataset(self, name):
+        return self.path + '/' + name
+
+    def _fs(self, path):
+        jvm = self.sc._jvm
+        p = jvm.org.apache.hadoop.fs.Path(path)
+        return p.getFileSystem(self.sc._jsc.hadoopConfiguration()), p
+
+    def _complete(self, name):
+        if not self.enabled:
+            return False
+        fs, p = self._fs(self._dataset(name) + '/_SUCCESS')
+        return fs.exists(p)
+
+    def _save(self, name, rdd):
+        fs, p = self._fs(self._dataset(name))
+        # Left over by a run that crashed while writing it.
+        if fs.exists(p):
+            fs.delete(p, True)
+        rdd.saveAsPickleFile(self._dataset(name))
+
+    def remember(self, name, compute):
+        """
+        Value: the checkpointed summary value `name`, or compute(), which is
+               saved with the summary by save_summary
+        """
+        if name not in self.summary:
+            self.summary[name] = compute()
+            self.changed = True
+        return self.summary[name]
+
+    def save_summary(self):
+        """
+        Save the summary, if it gained values since it was read back (e.g.
+        those of a mode the checkpointed run did not use).
+        """
+        if self.enabled and self.changed:
+            self._save('summary', self.sc.parallelize([self.summary], 1))
+            self.changed = False
+
+    def rdd(self, name, compute):
+        """
+        Value: RDD `name` read back from its checkpoint, or compute() after
+               it was checkpointed (compute is not called on a resume)
+        """
+        if not self.enabled:
+            return compute()
+        if not self._complete(name):
+            self._save(name, compute())
+        else:
+            self.resumed.append(name)
+        return self.sc.pickleFile(self._dataset(name))
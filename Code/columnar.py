@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Columnar copy of the parsed tweet stream.
+
+The raw JSON only has to be parsed once: `write_tweets` stores the parsed
+projection as Parquet, partitioned by UTC day and sorted by user within
+each file. Analyses then read just the columns they need with
+`load_tweets`, which pushes day and user filters down to the files, so
+days outside the range are never opened and row groups without the wanted
+users are skipped.
+"""
+
+import time
+
+from pyspark.sql.types import (StructType, StructField, LongType, StringType,
+                               ArrayType, BooleanType)
+
+from tweet_parser import parse_tweets, parse_created_at
+
+schema = StructType([
+    StructField('user_id', LongType(), False),
+    StructField('text', StringType(), False),
+    StructField('created_at', LongType(), True),
+    StructField('hashtags', ArrayType(StringType()), True),
+    StructField('is_retweet', BooleanType(), False),
+    StructField('retweet_of', StringType(), True),
+    StructField('day', StringType(), True),
+])
+
+# Memo of days since the epoch -> 'YYYY-MM-DD'.
+_day_names = {}
+
+
+def day_name(timestamp):
+    days = timestamp // 86400
+    try:
+        return _day_names[days]
+    except KeyError:
+        name = _day_names[days] = time.strftime('%Y-%m-%d', time.gmtime(days * 86400))
+        return name
+
+
+def tweet_rows(lines, broken=None, non_tweets=None):
+    """
+    Parse a partition of raw JSON lines into tuples in the order of `schema`.
+    """
+    for tw in parse_tweets(lines, broken, non_tweets, with_extras=True):
+        created_at = day = None
+        if tw.created_at:
+            try:
+                created_at = parse_created_at(tw.created_at)
+                day = day_name(created_at)
+            except ValueError:
+                # Kept, with a null created_at and day, like tweets without one.
+                created_at = None
+        hashtags = None
+        if tw.entities:
+            hashtags = [h['text'] for h in tw.entities.get('hashtags', [])]
+        yield (int(tw.user_id), tw.text.decode('utf-8'), created_at, hashtags,
+               tw.retweet_of is not None, tw.retweet_of, day)
+
+
+def write_tweets(sqlContext, lines, path, broken=None, non_tweets=None, mode='error'):
+    """
+    Argument: lines -- RDD of raw JSON lines
+              path -- output directory of the Parquet dataset
+    """
+    rows = lines.mapPartitions(lambda part: tweet_rows(part, broken, non_tweets))
+    df = sqlContext.createDataFrame(rows, schema)
+    df.sortWithinPartitions('day', 'user_id').write.partitionBy('day').parquet(path, mode=mode)
+
+
+def load_tweets(sqlContext, path, columns=('user_id', 'text'), since=None, until=None, user_ids=None):
+    """
+    Argument: path -- a dataset written by write_tweets
+              columns -- the columns to read
+              since, until -- optional inclusive UTC days, as 'YYYY-MM-DD'
+              user_ids -- optional collection of numeric user ids to keep
+    Value: DataFrame of the selected columns
+    """
+    df = sqlContext.read.parquet(path)
+    if since is not None:
+        df = df.filter(df.day >= since)
+    if until is not None:
+        df = df.filter(df.day <= until)
+    if user_ids is not None:
+        df = df.filter(df.user_id.isin(list(user_ids)))
+    return df.select(*columns)
+
+
+def user_text_pairs(df):
+    """
+    The (user_id, text) pairs of the raw pipeline, with the same utf-8 byte
+    strings, from a DataFrame with user_id and text columns.
+    """
+    return df.rdd.map(lambda r: (str(r.user_id), r.text.encode('utf-8')))
+
+
+def user_retweet_pairs(df):
+    """
+    (user_id, (text, retweet_of or None)) pairs, as retweets.py takes them,
+    from a DataFrame with user_id, text and retweet_of columns.
+    """
+    return df.rdd.map(lambda r: (str(r.user_id), (r.text.encode('utf-8'),
+                                                  r.retweet_of.encode('utf-8') if r.retweet_of else None)))
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Memory-mappable on-disk index of the per-(group, token) user counts, for
+answering queries without rerunning the pipeline (see query_server.py).
+
+`write_count_index` stores the PopularityMatrix of a run and the names of
+its tokens as flat arrays in a directory. The tokens (columns) are sorted
+by decreasing N_t^all, so the tokens above any `min users` threshold are a
+prefix of the columns:
+
+    counts.npy   groups x V int64 user counts N_t^k
+    totals.npy   V int64 N_t^all, decreasing
+    ids.npy      V int64 token ids (see token_ids.py)
+    names.bin    the utf-8 token names of the columns, back to back
+    offsets.npy  V + 1 int64 offsets of the names in names.bin
+    by_name.npy  V int64 column numbers, sorted by name
+    meta.json    number of groups and tokens, and the min users of the tokens
+
+`CountIndex` maps the files, so opening even a multi-million token
+index reads nothing but meta.json; queries touch only the pages they need.
+Names are found by binary search over by_name, and prefixes as a range of
+it.
+
+An index only holds the tokens mentioned by at least `min_users` users
+(the --min-users-floor of the run), so rankings below that threshold, and
+the counts of rarer tokens, cannot be answered from it.
+"""
+
+import json
+import mmap
+import os
+from math import log
+
+import numpy as np
+
+from popularity import _top
+
+INDEX_FORMAT = 2
+_ARRAYS = ('counts', 'totals', 'ids', 'offsets', 'by_name')
+
+
+def write_count_index(directory, matrix, names, min_users=1):
+    """
+    Argument: directory -- where to write the index (created if needed)
+              matrix -- PopularityMatrix of the counts
+              names -- dict of token id -> token, for every token of the matrix
+              min_users -- the matrix holds every token mentioned by at least
+                           this many users (and maybe rarer ones)
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    totals = matrix.totals()
+    order = np.argsort(-totals, kind='mergesort')
+    ids = matrix.token_ids[order]
+    encoded = []
+    for i in ids.tolist():
+        name = names[i]
+        encoded.append(name.encode('utf-8') if isinstance(name, unicode) else name)
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(name) for name in encoded])
+    by_name = np.array(sorted(range(len(encoded)), key=encoded.__getitem__), dtype=np.int64)
+    arrays = {'counts': np.ascontiguousarray(matrix.counts[:, order], dtype=np.int64),
+              'totals': totals[order].astype(np.int64), 'ids': ids, 'offsets': offsets, 'by_name': by_name}
+    for name in _ARRAYS:
+        np.save(os.path.join(directory, name + '.npy'), arrays[name])
+    with open(os.path.join(directory, 'names.bin'), 'wb') as f:
+        f.write(''.join(encoded))
+    # meta.json last: an index without it is incomplete.
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({'format': INDEX_FORMAT, 'groups': matrix.num_groups, 'tokens': len(encoded),
+                   'min_users': min_users}, f)
+
+
+class CountIndex(object):
+    """
+    Read-only view of an index written by write_count_index.
+    """
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != INDEX_FORMAT:
+            raise ValueError('%s: index format %s, expected %d' % (directory, meta['format'], INDEX_FORMAT))
+        self.num_groups = meta['groups']
+        self.min_users = meta['min_users']
+        for name in _ARRAYS:
+            setattr(self, name, np.load(os.path.join(directory, name + '.npy'), mmap_mode='r'))
+        self._names = ''
+        if meta['tokens'] and self.offsets[-1]:
+            with open(os.path.join(directory, 'names.bin'), 'rb') as f:
+                self._names = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self.totals)
+
+    def __getitem__(self, column):
+        """
+        Value: the name of a column, as unicode
+        """
+        return self._name(column).decode('utf-8')
+
+    def _name(self, column):
+        return self._names[int(self.offsets[column]):int(self.offsets[column + 1])]
+
+    def frequent(self, min_users):
+        """
+        Value: the number of leading columns mentioned by at least min_users users
+        """
+        return len(self.totals) - int(np.searchsorted(self.totals[::-1], min_users))
+
+    def _bound(self, key):
+        # First position in by_name whose name is >= key.
+        lo, hi = 0, len(self.by_name)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._name(self.by_name[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def column(self, token):
+        """
+        Value: the column of a token, or None
+        """
+        key = token.encode('utf-8') if isinstance(token, unicode) else token
+        pos = self._bound(key)
+        if pos < len(self.by_name) and self._name(self.by_name[pos]) == key:
+            return int(self.by_name[pos])
+        return None
+
+    def prefixed(self, prefix, limit=None):
+        """
+        Value: the columns of the tokens starting with prefix, by name
+        """
+        key = prefix.encode('utf-8') if isinstance(prefix, unicode) else prefix
+        lo = self._bound(key)
+        hi = lo
+        while hi < len(self.by_name) and self._name(self.by_name[hi]).startswith(key):
+            if limit is not None and hi - lo >= limit:
+                break
+            hi += 1
+        return [int(c) for c in self.by_name[lo:hi]]
+
+    def token(self, column, unassigned_group=None):
+        """
+        Value: dict of the counts and relative popularities of a column, and
+               the group with the highest popularity (other than unassigned_group)
+        """
+        counts = [int(c) for c in self.counts[:, column]]
+        total = int(self.totals[column])
+        popularity = [log(float(c) / total) / log(2) if c else None for c in counts]
+        ranked = [g for g in range(self.num_groups) if g != unassigned_group and counts[g]]
+        leader = max(ranked, key=lambda g: (counts[g], -g)) if ranked else None
+        return {'token': self[column], 'users': counts, 'total': total, 'popularity': popularity, 'leader': leader}
+
+    def top_overall(self, k, min_users=1):
+        """
+        Value: the k tokens mentioned by most users, as (token, N_t^all) pairs
+        """
+        n = self.frequent(min_users)
+        return _top(np.arange(n), np.asarray(self.totals[:n]), self, k)
+
+    def top_k(self, group, k, min_users=1):
+        """
+        Value: the k (token, p) pairs of the tokens mentioned by at least
+               min_users users with the highest relative popularity in group,
+               ranked as PopularityMatrix.top_k ranks them
+        """
+        n = self.frequent(min_users)
+        counts = np.asarray(self.counts[group, :n])
+        mentioned = np.flatnonzero(counts)
+        with np.errstate(divide='ignore'):
+            pop = np.log(counts[mentioned] / np.asarray(self.totals[:n])[mentioned].astype(np.float64)) / np.log(2)
+        return _top(mentioned, pop, self, k)
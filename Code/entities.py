@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Tokens read straight from the `entities` Twitter already extracted from
+each tweet, for a cheap first look at hashtags, mentions and linked sites
+without running the tokenizer.
+
+    hashtags        '#' + text, lowercased      e.g. #feelthebern
+    user_mentions   '@' + screen_name, lowercased e.g. @realdonaldtrump
+    urls            domain of expanded_url (or url), without 'www.'
+"""
+
+from urlparse import urlparse
+
+from tweet_parser import parse_tweets
+
+
+def url_domain(url):
+    """
+    Value: lowercased host of the url without a leading 'www.', or None
+    """
+    host = urlparse(url).netloc.lower()
+    if '@' in host:
+        host = host.rsplit('@', 1)[1]
+    host = host.split(':', 1)[0]
+    if host.startswith('www.'):
+        host = host[4:]
+    return host or None
+
+
+def entity_tokens(entities):
+    """
+    Argument: entities -- the `entities` object of a tweet (or None)
+    Value: list of the distinct hashtag, mention and url domain tokens
+    """
+    if not entities:
+        return []
+    tokens = set()
+    for tag in entities.get('hashtags') or ():
+        tokens.add(u'#' + tag['text'].lower())
+    for mention in entities.get('user_mentions') or ():
+        tokens.add(u'@' + mention['screen_name'].lower())
+    for url in entities.get('urls') or ():
+        domain = url_domain(url.get('expanded_url') or url.get('url') or '')
+        if domain:
+            tokens.add(domain)
+    return list(tokens)
+
+
+def entity_partition(lines, broken=None, non_tweets=None):
+    """
+    Value: generator of (user_id, entity tokens), one per tweet in lines
+    """
+    for tw in parse_tweets(lines, broken, non_tweets, with_extras=True):
+        yield tw.user_id, entity_tokens(tw.entities)
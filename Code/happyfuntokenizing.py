@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+
+"""
+This code implements a basic, Twitter-aware tokenizer.
+
+A tokenizer is a function that splits a string of text into words. In
+Python terms, we map string and unicode objects into lists of unicode
+objects.
+
+There is not a single right way to do tokenizing. The best method
+depends on the application.  This tokenizer is designed to be flexible
+and this easy to adapt to new domains and tasks.  The basic logic is
+this:
+
+1. The tuple regex_strings defines a list of regular expression
+   strings.
+
+2. The regex_strings strings are put, in order, into a compiled
+   regular expression object called word_re.
+
+3. The tokenization is done by word_re.findall(s), where s is the
+   user-supplied string, inside the tokenize() method of the class
+   Tokenizer.
+
+4. When instantiating Tokenizer objects, there is a single option:
+   preserve_case.  By default, it is set to True. If it is set to
+   False, then the tokenizer will downcase everything except for
+   emoticons.
+
+The __main__ method illustrates by tokenizing a few examples.
+
+I've also included a Tokenizer method tokenize_random_tweet(). If the
+twitter library is installed (http://code.google.com/p/python-twitter/)
+and Twitter is cooperating, then it should tokenize a random
+English-language tweet.
+
+__author__ = "Christopher Potts"
+__version__ = "1.0"
+"""
+
+import re
+import htmlentitydefs
+
+# Bumped whenever the tokens produced for some text change, so that the
+# token ids checkpointed by earlier runs are not reused (see checkpoints.py).
+TOKENIZER_VERSION = 1
+
+# The following strings are components in the regular expression
+# that is used for tokenizing. It's important that phone_number
+# appears first in the final regex (since it can contain whitespace).
+# It also could matter that tags comes after emoticons, due to the
+# possibility of having text like
+#
+#     <:| and some text >:)
+#
+# Most imporatantly, the final element should always be last, since it
+# does a last ditch whitespace-based tokenization of whatever is left.
+
+# This particular element is used in a couple ways, so we define it
+# with a name:
+emoticon_string = r"""
+    (?:
+      [<>]?
+      [:;=8]                     # eyes
+      [\-o\*\']?                 # optional nose
+      [\)\]\(\[dDpP/\:\}\{@\|\\] # mouth      
+      |
+      [\)\]\(\[dDpP/\:\}\{@\|\\] # mouth
+      [\-o\*\']?                 # optional nose
+      [:;=8]                     # eyes
+      [<>]?
+    )"""
+
+# The components of the tokenizer:
+regex_strings = (
+    # Phone numbers:
+    r"""
+    (?:
+      (?:            # (international)
+        \+?[01]
+        [\-\s.]*
+      )?            
+      (?:            # (area code)
+        [\(]?
+        \d{3}
+        [\-\s.\)]*
+      )?    
+      \d{3}          # exchange
+      [\-\s.]*   
+      \d{4}          # base
+    )"""
+    ,
+    # URLs:
+    r"""http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"""
+    ,
+    # Emoticons:
+    emoticon_string
+    ,    
+    # HTML tags:
+     r"""<[^>]+>"""
+    ,
+    # Twitter username:
+    r"""(?:@[\w_]+)"""
+    ,
+    # Twitter hashtags:
+    r"""(?:\#+[\w_]+[\w\'_\-]*[\w_]+)"""
+    ,
+    # Remaining word types:
+    r"""
+    (?:[a-z][a-z'\-_]+[a-z])       # Words with apostrophes or dashes.
+    |
+    (?:[+\-]?\d+[,/.:-]\d+[+\-]?)  # Numbers, including fractions, decimals.
+    |
+    (?:[\w_]+)                     # Words without apostrophes or dashes.
+    |
+    (?:\.(?:\s*\.){1,})            # Ellipsis dots. 
+    |
+    (?:\S)                         # Everything else that isn't whitespace.
+    """
+    )
+
+######################################################################
+# This is the core tokenizing regex:
+    
+word_re = re.compile(r"""(%s)""" % "|".join(regex_strings), re.VERBOSE | re.I | re.UNICODE)
+
+# Phone numbers need digits; for texts without any, the same regex minus that (slow,
+# first-tried) alternative splits the text identically:
+word_re_no_phone = re.compile(r"""(%s)""" % "|".join(regex_strings[1:]), re.VERBOSE | re.I | re.UNICODE)
+digit_re = re.compile(r"\d", re.UNICODE)
+
+# The emoticon string gets its own regex so that we can preserve case for them as needed:
+emoticon_re = re.compile(regex_strings[1], re.VERBOSE | re.I | re.UNICODE)
+
+# These are for regularizing HTML entities to Unicode:
+html_entity_digit_re = re.compile(r"&#\d+;")
+html_entity_alpha_re = re.compile(r"&\w+;")
+amp = "&amp;"
+
+# Both entity forms in one regex, and the named entities as a precomputed table.
+html_entity_re = re.compile(r"&(?:#\d+|\w+);")
+html_entity_table = dict(("&%s;" % name, unichr(cp)) for name, cp in htmlentitydefs.name2codepoint.items())
+# A decoded numeric entity that is one of these characters could form a new named entity.
+html_entity_chars_re = re.compile(r"[&;\w]")
+
+# Kinds of entities, used as indexes into the flags kept by html2unicode:
+AMP, NAMED, NUMERIC, RESCAN = range(4)
+# Memo of entity -> (replacement, kind), filled as entities are seen.
+html_entity_memo = {}
+
+def _classify_entity(ent):
+    if ent == amp:
+        # Left alone here; html2unicode turns it into " and " at the end (see below).
+        return ent, AMP
+    if ent[1] != '#':
+        return html_entity_table.get(ent, ent), NAMED
+    try:
+        c = unichr(int(ent[2:-1]))
+    except (ValueError, OverflowError):
+        return ent, NUMERIC
+    return c, RESCAN if html_entity_chars_re.match(c) else NUMERIC
+
+def html2unicode(s):
+    """
+    Replace all the HTML entities in s with their unicode characters, in a
+    single regex pass. Gives the same result as the original two-pass
+    decoding, including that "&amp;" becomes " and " only when s also holds
+    another named entity.
+    """
+    if '&' not in s or s.count('&') == s.count(amp):
+        # No entities, or only "&amp;", which is then kept as it is.
+        return s
+    seen = [False] * 4
+
+    def decode(m):
+        ent = m.group()
+        try:
+            replacement, kind = html_entity_memo[ent]
+        except KeyError:
+            if len(html_entity_memo) > 100000:
+                html_entity_memo.clear()
+            replacement, kind = html_entity_memo[ent] = _classify_entity(ent)
+        seen[kind] = True
+        return replacement
+
+    decoded = html_entity_re.sub(decode, s)
+    if seen[RESCAN]:
+        # A numeric entity decoded to a character that may build a new entity with its
+        # neighbours, which only the original digits-then-names order handles.
+        return _html2unicode_twopass(s)
+    if seen[NAMED]:
+        decoded = decoded.replace(amp, " and ")
+    return decoded
+
+def _html2unicode_twopass(s):
+    """
+    The original decoding: numeric entities first, then a str.replace over
+    the whole string for every distinct named entity.
+    """
+    # First the digits:
+    ents = set(html_entity_digit_re.findall(s))
+    if len(ents) > 0:
+        for ent in ents:
+            entnum = ent[2:-1]
+            try:
+                entnum = int(entnum)
+                s = s.replace(ent, unichr(entnum))
+            except:
+                pass
+    # Now the alpha versions:
+    ents = set(html_entity_alpha_re.findall(s))
+    ents = filter((lambda x : x != amp), ents)
+    for ent in ents:
+        entname = ent[1:-1]
+        try:
+            s = s.replace(ent, unichr(htmlentitydefs.name2codepoint[entname]))
+        except:
+            pass
+        s = s.replace(amp, " and ")
+    return s
+
+######################################################################
+
+class Tokenizer:
+    def __init__(self, preserve_case=False):
+        self.preserve_case = preserve_case
+
+    def tokenize(self, s):
+        """
+        Argument: s -- any string or unicode object
+        Value: a tokenize list of strings; conatenating this list returns the original string if preserve_case=False
+        """        
+        # Try to ensure unicode:
+        try:
+            s = unicode(s)
+        except UnicodeDecodeError:
+            s = str(s).encode('string_escape')
+            s = unicode(s)
+        # Fix HTML character entitites:
+        s = self.__html2unicode(s)
+        # Tokenize:
+        words = word_re.findall(s)
+        # Possible alter the case, but avoid changing emoticons like :D into :d:
+        if not self.preserve_case:            
+            words = map((lambda x : x if emoticon_re.search(x) else x.lower()), words)
+        return words
+
+    def tokenize_random_tweet(self):
+        """
+        If the twitter library is installed and a twitter connection
+        can be established, then tokenize a random tweet.
+        """
+        try:
+            import twitter
+        except ImportError:
+            print "Apologies. The random tweet functionality requires the Python twitter library: http://code.google.com/p/python-twitter/"
+        from random import shuffle
+        api = twitter.Api()
+        tweets = api.GetPublicTimeline()
+        if tweets:
+            for tweet in tweets:
+                if tweet.user.lang == 'en':            
+                    return self.tokenize(tweet.text)
+        else:
+            raise Exception("Apologies. I couldn't get Twitter to give me a public English-language tweet. Perhaps try again")
+
+    def __html2unicode(self, s):
+        """
+        Internal metod that seeks to replace all the HTML entities in
+        s with their corresponding unicode characters.
+        """
+        return html2unicode(s)
+
+
+class FastTokenizer(Tokenizer):
+    """
+    High-throughput variant of Tokenizer(preserve_case=False) that returns
+    exactly the same tokens:
+
+    - results are kept in a bounded cache keyed by the text, so the many
+      identical retweet texts are tokenized only once. The cache keeps two
+      generations of plain dicts, an approximation of LRU that only uses
+      C-level dict operations (an OrderedDict costs more than it saves
+      when few texts repeat);
+    - HTML entity decoding returns straight away when the text contains no '&';
+    - the text is lowercased once and split with a single findall, without
+      the phone number alternative when the text has no digits. Only tokens
+      that can hold a URL (whose case is preserved) are looked at one by
+      one, and only when the text contains '://'.
+    """
+    def __init__(self, cache_size=10000):
+        Tokenizer.__init__(self, preserve_case=False)
+        self.cache_size = cache_size
+        self.recent = {}
+        self.older = {}
+
+    def tokenize(self, s):
+        """
+        Argument: s -- any string or unicode object
+        Value: the same list as Tokenizer(preserve_case=False).tokenize(s)
+        """
+        words = self.recent.get(s)
+        if words is None:
+            words = self.older.get(s)
+            if words is None:
+                words = tuple(self.__tokenize(s))
+            if len(self.recent) >= self.cache_size // 2:
+                self.older = self.recent
+                self.recent = {}
+            self.recent[s] = words
+        return list(words)
+
+    def __tokenize(self, s):
+        try:
+            s = unicode(s)
+        except UnicodeDecodeError:
+            s = str(s).encode('string_escape')
+            s = unicode(s)
+        s = html2unicode(s)
+        lowered = s.lower()
+        if len(lowered) != len(s):
+            # Lowercasing changed the length, so the spans of s do not line up with it.
+            return [x if emoticon_re.search(x) else x.lower() for x in word_re.findall(s)]
+        regex = word_re if digit_re.search(s) else word_re_no_phone
+        if '://' not in s:
+            # The regex ignores case, so it splits the lowercased text the same way.
+            return regex.findall(lowered)
+        words = []
+        for m in regex.finditer(s):
+            x = m.group()
+            words.append(x if emoticon_re.search(x) else lowered[m.start():m.end()])
+        return words
+
+
+def tokenize_partition(pairs, cache_size=10000):
+    """
+    Tokenize the values of a partition of (key, text) pairs with one
+    FastTokenizer, for use with `mapPartitions`.
+    """
+    tokenizer = FastTokenizer(cache_size)
+    for key, text in pairs:
+        yield key, tokenizer.tokenize(text)
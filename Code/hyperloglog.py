@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+HyperLogLog sketches for approximate distinct-user counts.
+
+Counting the distinct users of every (group, token) exactly needs either
+every user's full token set or every token's full user set. A sketch of
+2^p small registers per (group, token) bounds that memory, merges with a
+register-wise max (so it fits `aggregateByKey`/`reduceByKey`), and has a
+relative standard error of about 1.04 / sqrt(2^p).
+
+Sketches start out sparse (a dict of the registers that were touched) and
+only switch to a dense bytearray once that becomes the smaller form, which
+keeps the long tail of rare tokens cheap.
+"""
+
+import hashlib
+import struct
+from math import log, sqrt
+
+_uint64 = struct.Struct('<Q')
+_rank_bytes = [bytearray([r]) for r in range(65)]
+
+
+def hash64(value):
+    """
+    Argument: value -- a byte string (e.g. a user id)
+    Value: unsigned 64-bit hash of the value
+    """
+    return _uint64.unpack(hashlib.md5(value).digest()[:8])[0]
+
+
+def relative_error(p):
+    """
+    Relative standard error of a sketch with 2^p registers.
+    """
+    return 1.04 / sqrt(1 << p)
+
+
+def _alpha(m):
+    if m == 16:
+        return 0.673
+    if m == 32:
+        return 0.697
+    if m == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / m)
+
+
+class HyperLogLog(object):
+    __slots__ = ('p', 'sparse', 'registers')
+
+    def __init__(self, p=12):
+        if not 4 <= p <= 16:
+            raise ValueError('HyperLogLog precision must be between 4 and 16, got %d' % p)
+        self.p = p
+        self.sparse = {}
+        self.registers = None
+
+    def __getstate__(self):
+        return (self.p, self.sparse, self.registers)
+
+    def __setstate__(self, state):
+        self.p, self.sparse, self.registers = state
+
+    def _set(self, index, rank):
+        if self.registers is not None:
+            if rank > self.registers[index]:
+                self.registers[index] = rank
+        elif rank > self.sparse.get(index, 0):
+            self.sparse[index] = rank
+            # A dict entry costs far more than a one-byte register.
+            if len(self.sparse) > (1 << self.p) // 16:
+                self._densify()
+
+    def _densify(self):
+        self.registers = bytearray(1 << self.p)
+        for index, rank in self.sparse.items():
+            self.registers[index] = rank
+        self.sparse = None
+
+    def add_hash(self, h):
+        """
+        Argument: h -- unsigned 64-bit hash of the element
+        """
+        bits = 64 - self.p
+        w = h & ((1 << bits) - 1)
+        self._set(h >> bits, bits - w.bit_length() + 1)
+        return self
+
+    def add(self, value):
+        return self.add_hash(hash64(value))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError('cannot merge HyperLogLog sketches of precision %d and %d' % (self.p, other.p))
+        if other.registers is None:
+            for index, rank in other.sparse.items():
+                self._set(index, rank)
+        else:
+            if self.registers is None:
+                self._densify()
+            self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return self
+
+    def count(self):
+        """
+        Value: estimated number of distinct elements added
+        """
+        m = 1 << self.p
+        if self.registers is None:
+            zeros = m - len(self.sparse)
+            total = zeros + sum(2.0 ** -r for r in self.sparse.values())
+        else:
+            zeros = self.registers.count(_rank_bytes[0])
+            total = sum(self.registers.count(_rank_bytes[r]) * 2.0 ** -r for r in range(max(self.registers) + 1))
+        estimate = _alpha(m) * m * m / total
+        if estimate <= 2.5 * m and zeros > 0:
+            # Small range correction (linear counting).
+            estimate = m * log(1.0 * m / zeros)
+        return estimate
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Convert the raw tweet JSON listed in an input file to a Parquet dataset, once.
+
+Usage: spark-submit ingest.py [--input ../Data/data_input.txt] [--output ../Data/tweets.parquet]
+
+The output can then be analysed with
+`twitter_sentiment_analysis.py --parquet ../Data/tweets.parquet`.
+"""
+
+import argparse
+import os
+
+parser = argparse.ArgumentParser(description='Convert raw tweet JSON to a Parquet dataset partitioned by day.')
+parser.add_argument('--input', default='../Data/data_input.txt',
+                    help='file listing the raw tweet files, one per line, or directories, globs or files, '
+                         'comma-separated (see inputs.py)')
+parser.add_argument('--output', default='../Data/tweets.parquet',
+                    help='directory of the Parquet dataset to write')
+parser.add_argument('--overwrite', action='store_true', help='replace an existing dataset')
+args = parser.parse_args()
+
+from pyspark import SparkContext
+from pyspark.sql import SQLContext
+
+sc = SparkContext()
+code_dir = os.path.dirname(os.path.abspath(__file__))
+for module in ['tweet_parser.py', 'columnar.py', 'inputs.py']:
+    sc.addPyFile(os.path.join(code_dir, module))
+
+from columnar import write_tweets
+from inputs import InputPlan
+
+lines = InputPlan(args.input, min_partitions=sc.defaultParallelism).rdd(sc)
+
+broken_lines = sc.accumulator(0)
+non_tweets = sc.accumulator(0)
+write_tweets(SQLContext(sc), lines, args.output, broken_lines, non_tweets,
+             mode='overwrite' if args.overwrite else 'error')
+print 'Wrote %s (dropped %d broken lines and %d non-tweet messages)' % (args.output, broken_lines.value, non_tweets.value)
@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Input planning: which files a run reads, and how they are cut into
+partitions of about the same size.
+
+`--input` can be a manifest listing inputs one per line (the original
+data_input.txt), a directory, a glob, a tweet file, or several of those
+separated by commas; manifest lines can themselves be directories or globs.
+Files ending in .gz, .bz2 or .zst are decompressed transparently.
+
+The files are stat'ed on a thread pool, so tens of thousands of them are
+listed quickly. Plain files larger than the split size are cut into equal
+byte ranges, which are read like Hadoop splits: a split skips the line it
+starts in the middle of and reads through the line that crosses its end.
+Compressed files cannot be cut and are read whole. When that gives fewer
+splits than the partitions asked for, plain files are cut finer, at about
+the total size / partitions. The splits are then binned into partitions
+by estimated uncompressed size, largest first into the lightest
+partition, so one partition is not a single huge file next to many small
+ones.
+
+A file is read as a manifest only when its first entry is an existing
+path, a glob that matches or a remote path, so a tweet file that starts
+with a broken line is still read as tweets.
+
+The Python workers cannot read byte ranges of files on other file
+systems (hdfs://, s3a://, ...), so those are planned by Hadoop instead:
+CombineTextInputFormat lists them on `threads` threads and packs them,
+small files together and large splittable ones cut, into splits of at
+most the split size on disk. They are decompressed by the codecs Hadoop
+has (.zst needs its native zstd codec), and a compressed file counts by
+its compressed size. The local files of the same run are planned as above.
+"""
+
+import bz2
+import glob
+import gzip
+import heapq
+import io
+import os
+import signal
+import struct
+import subprocess
+from collections import namedtuple
+from itertools import chain
+from multiprocessing.pool import ThreadPool
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SPLIT_BYTES = 128 * 1024 * 1024
+# Files are not cut finer than this to make up the number of partitions.
+MIN_SPLIT_BYTES = 64 * 1024
+# Packs the remote files into splits of at most mapreduce.input.fileinputformat.split.maxsize bytes.
+COMBINE_FORMAT = 'org.apache.hadoop.mapreduce.lib.input.CombineTextInputFormat'
+# Typical uncompressed / compressed size of tweet JSON, when the file does not say.
+EXPANSION = {'.gz': 8, '.bz2': 12, '.zst': 10}
+
+# A byte range of a file (length None: the whole file), and its estimated uncompressed size.
+Split = namedtuple('Split', ['path', 'start', 'length', 'size'])
+
+
+def compression(path):
+    """
+    Value: '.gz', '.bz2' or '.zst', or None for plain files
+    """
+    ext = os.path.splitext(path)[1].lower()
+    return ext if ext in EXPANSION else None
+
+
+def is_remote(path):
+    return '://' in path and not path.startswith('file://')
+
+
+def _local(path):
+    return path[len('file://'):] if path.startswith('file://') else path
+
+
+def _is_input(entry):
+    if is_remote(entry):
+        return True
+    if glob.has_magic(entry):
+        return bool(glob.glob(_local(entry)))
+    return os.path.exists(_local(entry))
+
+
+def _is_manifest(path):
+    # A manifest starts with an input; a tweet file with a JSON object, or a broken line.
+    if compression(path):
+        return False
+    with open(path, 'rb') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                return not line.startswith('{') and _is_input(line)
+    return False
+
+
+def _walk(directory):
+    files = []
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d[:1] not in ('.', '_'))
+        files.extend(os.path.join(root, n) for n in sorted(names) if n[:1] not in ('.', '_'))
+    return files
+
+
+def list_inputs(spec):
+    """
+    Argument: spec -- manifest, directory, glob or file, or several separated by commas
+    Value: list of the input files, in the order given, without duplicates
+    """
+    files = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        if is_remote(entry):
+            files.append(entry)
+        elif glob.has_magic(entry):
+            for path in sorted(glob.glob(_local(entry))):
+                files.extend(_walk(path) if os.path.isdir(path) else [path])
+        elif os.path.isdir(_local(entry)):
+            files.extend(_walk(_local(entry)))
+        elif _is_manifest(_local(entry)):
+            with open(_local(entry)) as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        files.extend(list_inputs(line))
+        else:
+            files.append(_local(entry))
+    seen = set()
+    return [f for f in files if not (f in seen or seen.add(f))]
+
+
+def _stat(path):
+    """
+    Value: (path, size on disk, estimated uncompressed size)
+    """
+    size = os.path.getsize(path)
+    kind = compression(path)
+    if kind is None:
+        return path, size, size
+    estimate = size * EXPANSION[kind]
+    if kind == '.gz' and size >= 18:
+        # The gzip trailer holds the uncompressed size modulo 2^32 (of the last member).
+        with open(path, 'rb') as f:
+            f.seek(-4, os.SEEK_END)
+            isize = struct.unpack('<I', f.read(4))[0]
+        if isize >= size:
+            estimate = isize
+    return path, size, estimate
+
+
+def make_splits(stats, split_bytes=SPLIT_BYTES):
+    """
+    Argument: stats -- list of (path, size on disk, estimated uncompressed size)
+    Value: list of Split
+    """
+    splits = []
+    for path, size, estimate in stats:
+        if compression(path) or size <= split_bytes:
+            splits.append(Split(path, 0, None, estimate))
+            continue
+        # Equal pieces, rather than full splits and a small remainder.
+        pieces = -(-size // split_bytes)
+        step = -(-size // pieces)
+        for start in range(0, size, step):
+            length = min(step, size - start)
+            splits.append(Split(path, start, length, length))
+    return splits
+
+
+def cut_finer(stats, splits, split_bytes, partitions):
+    """
+    Value: splits, or when there are fewer of them than partitions, the
+           splits of the plain files cut at about total size / partitions
+    """
+    if len(splits) >= partitions:
+        return splits
+    total = sum(estimate for path, size, estimate in stats)
+    finer = max(MIN_SPLIT_BYTES, -(-total // partitions))
+    return make_splits(stats, finer) if finer < split_bytes else splits
+
+
+def balance(splits, partitions):
+    """
+    Value: list of `partitions` lists of splits with about the same total
+           size (largest first into the lightest), each in file order
+    """
+    bins = [[] for _ in range(max(1, min(partitions, len(splits))))]
+    loads = [(0, b) for b in range(len(bins))]
+    for split in sorted(splits, key=lambda s: -s.size):
+        load, b = heapq.heappop(loads)
+        bins[b].append(split)
+        heapq.heappush(loads, (load + split.size, b))
+    return [sorted(b, key=lambda s: (s.path, s.start)) for b in bins]
+
+
+class _ZstdProcess(object):
+    """
+    The output of `zstd -dc path`, closed by waiting for the process.
+    """
+    def __init__(self, path):
+        self.path = path
+        # With SIGPIPE restored (Python ignores it), a reader that stops early simply ends zstd.
+        self.process = subprocess.Popen(['zstd', '-dc', path], stdout=subprocess.PIPE, bufsize=1 << 16,
+                                        preexec_fn=lambda: signal.signal(signal.SIGPIPE, signal.SIG_DFL))
+        self.readline = self.process.stdout.readline
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def close(self):
+        self.process.stdout.close()
+        status = self.process.wait()
+        # Killed by SIGPIPE (negative) when the reader stopped early: no error.
+        if status > 0:
+            raise IOError('zstd -dc %s failed with status %d' % (self.path, status))
+
+
+def open_input(path):
+    """
+    Value: a binary file object of the decompressed content of path
+    Raise: IOError on close when zstd failed to decompress it
+    """
+    kind = compression(path)
+    if kind == '.gz':
+        return gzip.open(path, 'rb')
+    if kind == '.bz2':
+        return bz2.BZ2File(path, 'rb')
+    if kind == '.zst':
+        if zstandard is not None:
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb')))
+        # Without the zstandard package, through the zstd command line tool.
+        return _ZstdProcess(path)
+    return open(path, 'rb')
+
+
+def _lines(f):
+    # readline works on every file object open_input returns, with or without iteration support.
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        yield line
+
+
+def read_split(split):
+    """
+    Value: generator of the lines of a split, without their line breaks
+    """
+    if split.length is None:
+        f = open_input(split.path)
+        try:
+            for line in _lines(f):
+                yield line.rstrip('\r\n')
+        finally:
+            f.close()
+        return
+    end = split.start + split.length
+    with open(split.path, 'rb') as f:
+        pos = split.start
+        if pos:
+            # The line that began before the split belongs to the previous split.
+            f.seek(pos - 1)
+            pos += len(f.readline()) - 1
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.rstrip('\r\n')
+
+
+class InputPlan(object):
+    """
+    Argument: spec -- the --input value (see list_inputs)
+              partitions -- number of partitions (default: one per split_bytes of
+                            estimated uncompressed input, at least min_partitions)
+    """
+    def __init__(self, spec, partitions=None, split_bytes=SPLIT_BYTES, threads=16, min_partitions=1):
+        self.files = list_inputs(spec)
+        self.remote = [f for f in self.files if is_remote(f)]
+        self.split_bytes = split_bytes
+        self.threads = threads
+        local = [f for f in self.files if not is_remote(f)]
+        self.bins = []
+        self.size = 0
+        if not local:
+            return
+        pool = ThreadPool(threads)
+        try:
+            stats = pool.map(_stat, local)
+        finally:
+            pool.close()
+        self.size = sum(estimate for path, size, estimate in stats)
+        if partitions is None:
+            partitions = max(min_partitions, -(-self.size // split_bytes))
+        splits = cut_finer(stats, make_splits(stats, split_bytes), split_bytes, partitions)
+        self.bins = balance(splits, partitions)
+
+    def bin_sizes(self):
+        return [sum(s.size for s in b) for b in self.bins]
+
+    def rdd(self, sc):
+        """
+        Value: RDD of the raw lines (byte strings), one partition per bin,
+               followed by one per split Hadoop packs the remote files into
+        """
+        rdds = []
+        if self.bins:
+            rdds.append(sc.parallelize(self.bins, len(self.bins)).flatMap(
+                lambda splits: chain.from_iterable(read_split(s) for s in splits)))
+        if self.remote:
+            conf = {'mapreduce.input.fileinputformat.split.maxsize': str(self.split_bytes),
+                    'mapreduce.input.fileinputformat.list-status.num-threads': str(self.threads),
+                    'mapreduce.input.fileinputformat.input.dir.recursive': 'true'}
+            lines = sc.newAPIHadoopFile(','.join(self.remote), COMBINE_FORMAT, 'org.apache.hadoop.io.LongWritable',
+                                        'org.apache.hadoop.io.Text', conf=conf)
+            rdds.append(lines.map(lambda (offset, line): line.encode('utf-8')))
+        return rdds[0] if len(rdds) == 1 else sc.union(rdds)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Local backend: the same pipeline as the Spark script, on a process pool.
+
+For inputs that fit on one machine, starting a JVM and moving every record
+through Py4J costs more than the analysis itself. Here the input files are
+streamed in chunks of lines to a `multiprocessing` pool, where each worker
+parses and tokenizes its chunks (parse_tweets, FastTokenizer, token ids)
+into per-user token id sets. The parent merges those, counts the users of
+every group per token with NumPy, and ranks through the same
+PopularityMatrix and print functions as the Spark path, so the report is
+identical.
+"""
+
+import multiprocessing
+from collections import Counter
+from itertools import chain, islice
+
+import numpy as np
+
+from affinity import DEFAULT_CANDIDATES, CandidateAffinity
+from count_index import write_count_index
+from happyfuntokenizing import FastTokenizer
+from inputs import list_inputs, open_input
+from popularity import PopularityMatrix
+from reporting import (print_users_count, print_dropped, print_post_count, print_tokens,
+                       print_affinity, print_supporters)
+from token_ids import token_id
+from tweet_parser import parse_tweets, prefilter, json_backend, SKIPPED_TYPES
+from user_partition import PartitionIndex, index_from_pickle
+
+
+class _Count(object):
+    """
+    Stand-in for a Spark accumulator inside a worker.
+    """
+    def __init__(self):
+        self.value = 0
+
+    def add(self, n):
+        self.value += n
+
+
+def read_lines(files):
+    """
+    Stream the lines of all files, without their line breaks (decompressed, see inputs.py).
+    """
+    for path in files:
+        f = open_input(path)
+        try:
+            for line in f:
+                yield line.rstrip('\r\n')
+        finally:
+            f.close()
+
+
+def chunks(lines, size):
+    lines = iter(lines)
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Per worker process: one tokenizer (and its cache) and the token ids whose
+# names were already sent to the parent.
+_tokenizer = None
+_named = set()
+
+
+def user_tokens(lines):
+    """
+    Parse and tokenize a chunk of raw lines.
+    Value: (lines, broken lines, non-tweets, {message type: lines skipped by prefilter},
+            {user: posts}, {user: token ids}, {token id: token} for ids not named by this worker before)
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = FastTokenizer()
+    broken, non_tweets = _Count(), _Count()
+    skipped = dict((name, _Count()) for name in SKIPPED_TYPES)
+    posts = Counter()
+    tokens = {}
+    names = {}
+    for tw in parse_tweets(prefilter(lines, skipped), broken, non_tweets):
+        posts[tw.user_id] += 1
+        ids = tokens.setdefault(tw.user_id, set())
+        for t in set(_tokenizer.tokenize(tw.text)):
+            i = token_id(t)
+            ids.add(i)
+            if i not in _named:
+                _named.add(i)
+                names[i] = t
+    return (len(lines), broken.value, non_tweets.value, dict((name, c.value) for name, c in skipped.items()),
+            posts, tokens, names)
+
+
+def group_token_counts(user_sets, groups, num_groups):
+    """
+    Argument: user_sets -- list of token id sets, one per user
+              groups -- array with the group of each of those users
+    Value: PopularityMatrix of the users of each group mentioning each token
+    """
+    lengths = np.array([len(ids) for ids in user_sets], dtype=np.int64)
+    tids = np.fromiter(chain.from_iterable(user_sets), dtype=np.int64, count=int(lengths.sum()))
+    token_ids, column = np.unique(tids, return_inverse=True)
+    cell = np.repeat(groups.astype(np.int64), lengths) * len(token_ids) + column
+    counts = np.bincount(cell, minlength=num_groups * len(token_ids)).reshape(num_groups, len(token_ids))
+    return PopularityMatrix(token_ids, counts)
+
+
+def run_local(data_path, partition_path, num_groups=8, min_users=100, top_k=10,
+              workers=None, chunk_lines=2000, index_out=None, candidates=DEFAULT_CANDIDATES):
+    """
+    Run the whole analysis on a local process pool and print the same report
+    as the Spark script (and write the counts to index_out, see count_index.py).
+    """
+    unassigned_group = num_groups - 1
+    files = list_inputs(data_path)
+
+    line_count = broken = non_tweets = 0
+    skipped = Counter()
+    posts = Counter()
+    tokens = {}
+    names = {}
+    pool = multiprocessing.Pool(workers)
+    try:
+        for n, b, nt, chunk_skipped, chunk_posts, chunk_tokens, chunk_names in pool.imap(user_tokens, chunks(read_lines(files), chunk_lines)):
+            line_count += n
+            broken += b
+            non_tweets += nt
+            skipped.update(chunk_skipped)
+            posts.update(chunk_posts)
+            for u, ids in chunk_tokens.iteritems():
+                if u in tokens:
+                    tokens[u] |= ids
+                else:
+                    tokens[u] = ids
+            names.update(chunk_names)
+    finally:
+        pool.close()
+        pool.join()
+
+    # Part 0 and 1
+    print 'Number of elements:', line_count
+    print_users_count(len(posts))
+    print_dropped(broken, non_tweets, [(name, skipped[name]) for name in SKIPPED_TYPES], json_backend)
+
+    # Part 2
+    users = list(posts)
+    index = PartitionIndex.load(index_from_pickle(partition_path), unassigned_group)
+    groups = index.lookup_many([int(u) for u in users])
+    group_posts = np.bincount(groups, weights=[posts[u] for u in users], minlength=num_groups)
+
+    # Part 3
+    matrix = group_token_counts([tokens[u] for u in users], groups, num_groups)
+    print_rankings(group_posts, matrix, names, min_users, top_k, candidates)
+    if index_out:
+        write_count_index(index_out, matrix, names)
+        print 'Wrote the user counts of %d tokens to %s' % (len(matrix), index_out)
+
+
+def print_rankings(group_posts, matrix, names, min_users, top_k, candidates=DEFAULT_CANDIDATES):
+    """
+    Print Parts 2 and 3 of the report.
+
+    Argument: group_posts -- posts of every group
+              matrix -- PopularityMatrix of all tokens
+              names -- dict of token id -> token, for at least the frequent tokens
+              candidates -- list of (candidate, [alias]) scored against the groups (see affinity.py)
+    """
+    num_groups = matrix.num_groups
+    print_post_count([(g, int(c)) for g, c in enumerate(group_posts) if c > 0])
+
+    print 'Number of elements:', len(matrix)
+    frequent = matrix.frequent(min_users)
+    print 'Number of elements:', len(frequent)
+    print_tokens(frequent.top_overall(names, 20))
+    tops = frequent.top_k(names, top_k)
+    for g in range(num_groups):
+        print_tokens(tops[g], g)
+
+    affinity = CandidateAffinity(frequent, names, candidates)
+    leaders = affinity.leaders(num_groups - 1)
+    print_affinity(affinity.candidates, affinity.affinity, leaders)
+    print_supporters([(g, name) for (g, margin), name in zip(leaders, affinity.candidates)])
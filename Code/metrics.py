@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Per-stage instrumentation of the pipeline.
+
+Every logical stage (Part 0 to Part 3) is bracketed with `begin`/`end`,
+which records its wall-clock time and the input, output and dropped record
+counts passed to `end`. Counters that have to be collected on the executors
+(broken lines, users not in any partition, ...) are Spark accumulators
+registered with `counter`, and the optional tokenizer latency histograms
+use a dict-valued accumulator. `write` dumps everything as one JSON file.
+"""
+
+import json
+import time
+
+from pyspark.accumulators import AccumulatorParam
+
+# Upper bounds (in microseconds) of the tokenizer latency buckets; the last
+# bucket holds everything slower.
+LATENCY_BUCKETS_US = [10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class HistogramsParam(AccumulatorParam):
+    """
+    Accumulates {partition index: [count per latency bucket]}.
+    """
+    def zero(self, value):
+        return {}
+
+    def addInPlace(self, h1, h2):
+        for pid, counts in h2.items():
+            if pid in h1:
+                h1[pid] = [a + b for a, b in zip(h1[pid], counts)]
+            else:
+                h1[pid] = list(counts)
+        return h1
+
+
+def bucket(latency_us):
+    for i, bound in enumerate(LATENCY_BUCKETS_US):
+        if latency_us < bound:
+            return i
+    return len(LATENCY_BUCKETS_US)
+
+
+def timed_tokenize_partition(tokenize_partition, histograms):
+    """
+    Wrap a (key, text) -> (key, tokens) partition function for
+    mapPartitionsWithIndex so that every tweet's tokenization time lands in
+    that partition's latency histogram.
+    """
+    def run(pid, pairs):
+        counts = [0] * (len(LATENCY_BUCKETS_US) + 1)
+        it = tokenize_partition(pairs)
+        while True:
+            start = time.time()
+            try:
+                item = next(it)
+            except StopIteration:
+                break
+            counts[bucket((time.time() - start) * 1e6)] += 1
+            yield item
+        histograms.add({pid: counts})
+    return run
+
+
+class PipelineMetrics(object):
+    def __init__(self, sc):
+        self.sc = sc
+        self.stages = []
+        self.counters = {}
+        self.histograms = None
+        self._open = {}
+        self.started = time.time()
+
+    def counter(self, name):
+        """
+        Value: a new integer accumulator reported under `name`
+        """
+        self.counters[name] = self.sc.accumulator(0)
+        return self.counters[name]
+
+    def tokenizer_histograms(self):
+        """
+        Value: the accumulator of per-partition tokenizer latency histograms
+        """
+        if self.histograms is None:
+            self.histograms = self.sc.accumulator({}, HistogramsParam())
+        return self.histograms
+
+    def begin(self, name):
+        self._open[name] = time.time()
+
+    def end(self, name, records_in=None, records_out=None, **dropped):
+        """
+        Close stage `name`, with its record counts; other keyword arguments
+        are counts of dropped records.
+        """
+        start = self._open.pop(name)
+        self.stages.append({
+            'stage': name,
+            'seconds': time.time() - start,
+            'records_in': records_in,
+            'records_out': records_out,
+            'dropped': dropped,
+        })
+
+    def report(self):
+        report = {
+            'total_seconds': time.time() - self.started,
+            'stages': self.stages,
+            'counters': dict((name, acc.value) for name, acc in self.counters.items()),
+        }
+        if self.histograms is not None:
+            per_partition = self.histograms.value
+            overall = [0] * (len(LATENCY_BUCKETS_US) + 1)
+            for counts in per_partition.values():
+                overall = [a + b for a, b in zip(overall, counts)]
+            report['tokenizer_latency_us'] = {
+                'bucket_upper_bounds': LATENCY_BUCKETS_US + [None],
+                'overall': overall,
+                'per_partition': dict((str(pid), counts) for pid, counts in sorted(per_partition.items())),
+            }
+        return report
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
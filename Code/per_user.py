@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+The parsed tweets partitioned by user once, and one pass over them for
+everything keyed by user.
+
+`by_user` shuffles the (user_id, value) pairs a single time so that all of
+a user's tweets sit next to each other in one partition, sorted by user.
+Heavy posters (see skew.py) are the exception. Their tweets are dealt
+round-robin over `buckets` sub-keys so they do not all land in one task.
+`user_summaries` then walks each partition once and emits, per user, the
+number of posts and the set of token ids (and, with `named_user_summaries`,
+the names of the tokens it met). The unique users, the posts per
+group and the per-user token sets are all narrow operations on that
+output. Only the partial summaries of the heavy posters still have to be
+merged, with a small shuffle.
+"""
+
+from itertools import groupby
+from operator import itemgetter
+
+from skew import salted_token_sets, union_sets
+from token_ids import token_id_set, named_token_ids
+
+
+def by_user(pairs, hot, buckets, partitions):
+    """
+    Argument: pairs -- RDD of (user_id, value)
+              hot -- broadcast set of the users to spread over `buckets` keys
+    Value: RDD of the same pairs, hash partitioned by user and sorted by user
+           within every partition
+    """
+    def keyed(pid, records):
+        k = pid
+        for u, value in records:
+            if u in hot.value:
+                k += 1
+                yield (u, 1 + k % buckets), value
+            else:
+                yield (u, 0), value
+    spread = pairs.mapPartitionsWithIndex(keyed).repartitionAndSortWithinPartitions(partitions)
+    return spread.map(lambda ((u, b), value): (u, value))
+
+
+def user_summaries(pairs, ids_of=token_id_set):
+    """
+    Argument: pairs -- (user_id, tokens or None) of one partition, grouped by user
+              ids_of -- tokens -> a new token id set (`set` when the values
+                        already are token id sets, see retweets.py)
+    Value: generator of (user_id, (posts, token id set or None)), one per user
+    """
+    for u, tweets in groupby(pairs, key=itemgetter(0)):
+        posts = 0
+        ids = None
+        for _, tokens in tweets:
+            posts += 1
+            if tokens is not None:
+                if ids is None:
+                    ids = ids_of(tokens)
+                else:
+                    ids |= ids_of(tokens)
+        yield u, (posts, ids)
+
+
+def named_user_summaries(pairs):
+    """
+    Argument: pairs -- (user_id, tokens or token id set) of one partition, grouped by user
+    Value: the user_summaries of pairs, then one (None, {token: token id})
+           record with the name of every token of the partition (see
+           token_ids.names_of)
+    """
+    vocabulary = {}
+    for summary in user_summaries(named_token_ids(pairs, vocabulary), set):
+        yield summary
+    yield None, vocabulary
+
+
+def unique_users(summaries, hot):
+    """
+    Value: the number of distinct users in the summaries
+    """
+    n = summaries.filter(lambda (u, s): u not in hot.value).count()
+    if hot.value:
+        n += summaries.filter(lambda (u, s): u in hot.value).keys().distinct().count()
+    return n
+
+
+def user_posts(summaries, hot):
+    """
+    Value: RDD of (user_id, posts), one per user
+    """
+    posts = summaries.map(lambda (u, (n, ids)): (u, n))
+    if not hot.value:
+        return posts
+    heavy = posts.filter(lambda (u, n): u in hot.value).reduceByKey(lambda a, b: a + b)
+    return posts.filter(lambda (u, n): u not in hot.value).union(heavy)
+
+
+def user_token_sets(summaries, hot, buckets):
+    """
+    Value: RDD of ((user_id, bucket), [token id]). A heavy poster's partial
+           sets are merged by token bucket (see skew.py); everyone else has
+           a single (user_id, 0) key.
+    """
+    sets = summaries.filter(lambda (u, s): u not in hot.value).map(lambda (u, (n, ids)): ((u, 0), list(ids)))
+    if not hot.value:
+        return sets
+    heavy = summaries.filter(lambda (u, s): u in hot.value).mapPartitions(
+        lambda records: salted_token_sets(((u, ids) for u, (n, ids) in records), hot.value, buckets))
+    return sets.union(heavy.combineByKey(*union_sets()).mapValues(list))
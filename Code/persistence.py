@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Where the intermediate RDDs of the pipeline are kept, and for how long.
+
+The script persists these datasets:
+
+    raw       the raw JSON lines (only read by the line count and the parser)
+    parsed    with --dedup-retweets, the parsed tweets before tokenizing
+    retweets  with --dedup-retweets, the token ids of every retweeted text, and their names (see retweets.py)
+    tweets    the parsed (user_id, text) pairs, partitioned by user (see per_user.py)
+    users     the per-user posts and token sets, and the names of the tokens (Parts 1 to 3)
+    counts    the per-token user counts of every group (Part 3)
+
+A mode picks a storage level for each of them. PySpark always stores
+cached partitions as pickled bytes, so the choice that matters is memory
+versus disk: `memory` is the original behaviour, `memory-and-disk` spills
+the large datasets instead of recomputing them, `disk` keeps only the
+small counts in memory, and `low-memory` does not cache the raw lines at
+all and keeps the tweets on disk, so only the (group, token) counts take
+executor memory.
+
+Each dataset is released with `release` once the datasets computed from it
+are materialized.
+"""
+
+from pyspark import StorageLevel
+
+MODES = {
+    'memory': {
+        'raw': StorageLevel.MEMORY_ONLY,
+        'parsed': StorageLevel.MEMORY_ONLY,
+        'retweets': StorageLevel.MEMORY_ONLY,
+        'tweets': StorageLevel.MEMORY_ONLY,
+        'users': StorageLevel.MEMORY_ONLY,
+        'counts': StorageLevel.MEMORY_ONLY,
+    },
+    'memory-and-disk': {
+        'raw': StorageLevel.MEMORY_AND_DISK,
+        'parsed': StorageLevel.MEMORY_AND_DISK,
+        'retweets': StorageLevel.MEMORY_ONLY,
+        'tweets': StorageLevel.MEMORY_AND_DISK,
+        'users': StorageLevel.MEMORY_AND_DISK,
+        'counts': StorageLevel.MEMORY_ONLY,
+    },
+    'disk': {
+        'raw': StorageLevel.DISK_ONLY,
+        'parsed': StorageLevel.DISK_ONLY,
+        'retweets': StorageLevel.MEMORY_AND_DISK,
+        'tweets': StorageLevel.DISK_ONLY,
+        'users': StorageLevel.DISK_ONLY,
+        'counts': StorageLevel.MEMORY_AND_DISK,
+    },
+    'low-memory': {
+        'raw': None,
+        'parsed': StorageLevel.DISK_ONLY,
+        'retweets': StorageLevel.MEMORY_AND_DISK,
+        'tweets': StorageLevel.DISK_ONLY,
+        'users': StorageLevel.DISK_ONLY,
+        'counts': StorageLevel.MEMORY_AND_DISK,
+    },
+}
+
+
+class PersistencePlan(object):
+    def __init__(self, mode='memory-and-disk'):
+        self.mode = mode
+        self.levels = MODES[mode]
+        self.persisted = {}
+
+    def persist(self, name, rdd):
+        """
+        Persist rdd with the storage level of dataset `name` in this mode
+        (or not at all).
+        Value: rdd
+        """
+        level = self.levels[name]
+        if level is not None:
+            rdd.persist(level)
+            self.persisted[name] = rdd
+        return rdd
+
+    def release(self, name):
+        """
+        Unpersist dataset `name`, if it was persisted.
+        """
+        rdd = self.persisted.pop(name, None)
+        if rdd is not None:
+            rdd.unpersist()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Relative popularity of tokens per user group, computed on the driver.
+
+The Spark side only has to produce, for every token, the number of users
+of each group that mentioned it. Those counts are collected into a
+groups x tokens NumPy matrix, and the `>= 100 users` filter, the log2
+ratios and the per-group top-k are all array operations on that matrix,
+so thresholds and k can be changed without recomputing anything upstream.
+"""
+
+from math import log
+
+import numpy as np
+
+
+def get_rel_popularity(c_k, c_all):
+    return log(1.0 * c_k / c_all) / log(2)
+
+
+def count_vector(num_groups):
+    """
+    combineByKey functions that turn (token, (group, users)) records into
+    (token, [users of group 0, users of group 1, ...]) count vectors.
+    """
+    def create((g, n)):
+        counts = [0] * num_groups
+        counts[g] = n
+        return counts
+
+    def add(counts, (g, n)):
+        counts[g] += n
+        return counts
+
+    def merge(counts, other):
+        for g, c in enumerate(other):
+            counts[g] += c
+        return counts
+
+    return create, add, merge
+
+
+class PopularityMatrix(object):
+    def __init__(self, token_ids, counts):
+        """
+        Argument: token_ids -- int64 array of the V token ids
+                  counts -- groups x V array of user counts
+        """
+        self.token_ids = token_ids
+        self.counts = counts
+
+    @classmethod
+    def from_rows(cls, rows, num_groups):
+        """
+        Argument: rows -- list of (token_id, per-group count vector)
+        """
+        token_ids = np.array([t for t, c in rows], dtype=np.int64)
+        counts = np.array([c for t, c in rows], dtype=np.int64).reshape(len(rows), num_groups).T
+        return cls(token_ids, np.ascontiguousarray(counts))
+
+    def __len__(self):
+        return len(self.token_ids)
+
+    @property
+    def num_groups(self):
+        return self.counts.shape[0]
+
+    def totals(self):
+        """
+        Value: N_t^all for every token
+        """
+        return self.counts.sum(axis=0)
+
+    def frequent(self, min_users):
+        """
+        Value: the matrix restricted to tokens mentioned by at least min_users users
+        """
+        keep = self.totals() >= min_users
+        return PopularityMatrix(self.token_ids[keep], self.counts[:, keep])
+
+    def rel_popularity(self):
+        """
+        Value: groups x V array of p_t^k = log2(N_t^k / N_t^all), -inf where N_t^k is 0
+        """
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.log(self.counts / self.totals().astype(np.float64)) / np.log(2)
+
+    def top_overall(self, names, k):
+        """
+        Value: the k tokens mentioned by most users, as (token, N_t^all) pairs
+        """
+        return _top(self.token_ids, self.totals(), names, k)
+
+    def top_k(self, names, k):
+        """
+        Argument: names -- dict of token id -> token, used for printing and tie-breaking
+        Value: dict of group -> k (token, p) pairs with the highest relative
+               popularity, sorted by (-p, token)
+        """
+        pop = self.rel_popularity()
+        tops = {}
+        for g in range(self.num_groups):
+            mentioned = self.counts[g] > 0
+            tops[g] = _top(self.token_ids[mentioned], pop[g][mentioned], names, k)
+        return tops
+
+
+def _top(token_ids, scores, names, k):
+    """
+    The k (token, score) pairs with the highest scores, ties broken by token.
+    Only the candidates at or above the k-th score are sorted in Python.
+    """
+    if len(scores) > k > 0:
+        cutoff = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= cutoff
+        token_ids, scores = token_ids[keep], scores[keep]
+    ranked = sorted((-s, names[t]) for t, s in zip(token_ids.tolist(), scores.tolist()))
+    return [(t, -s) for s, t in ranked[:k]]
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Preview of the report from a sample of the users, stratified by group.
+
+Every user is kept or dropped by a hash of their id, so all of a user's
+tweets are in or out together, and a group g is sampled at rate r_g: the
+requested fraction, raised for small groups so each has about min_users
+sampled users. Counts of group g are scaled by 1 / r_g (Horvitz-Thompson).
+
+Confidence intervals are analytic. Under this (Poisson) sampling a sum of
+per-user values x over a group has variance (1 - r) / r^2 * sum x^2 over
+the sampled users (x = 1 for user counts). The relative popularity
+log2(N_t^k / N_t^all) gets its interval by the delta method. How stable
+each group's top-k is comes from a bootstrap: the sampled counts are
+redrawn as Poisson variates, the top-k is ranked again, and the overlap
+with the point estimate is averaged.
+"""
+
+from math import log, sqrt
+
+import numpy as np
+
+from hyperloglog import hash64
+from popularity import PopularityMatrix
+
+Z95 = 1.96
+
+
+def sampling_rates(group_sizes, fraction, min_users=0):
+    """
+    Argument: group_sizes -- users of every group in the partition
+                             (0 for the group of unassigned users, whose size is unknown)
+              fraction -- share of the users to sample
+              min_users -- users to aim for in every group of known size
+    Value: array of the sampling rate of every group
+    """
+    sizes = np.asarray(group_sizes, dtype=np.float64)
+    rates = np.full(len(sizes), float(fraction))
+    if min_users:
+        known = sizes > 0
+        rates[known] = np.minimum(1.0, np.maximum(fraction, min_users / np.maximum(sizes[known], 1)))
+    return rates
+
+
+def group_sizes(index, num_groups):
+    """
+    Value: users of every group in a PartitionIndex, 0 for its default group
+    """
+    sizes = np.bincount(np.asarray(index.groups), minlength=num_groups)[:num_groups]
+    sizes[index.default] = 0
+    return sizes
+
+
+def sample_users(pairs, index, rates):
+    """
+    Argument: pairs -- iterable of (user_id, value)
+              index -- PartitionIndex of the users
+              rates -- sampling rate of every group
+    Value: generator of the pairs of the sampled users
+    """
+    limits = [r * 2.0 ** 64 for r in rates]
+    highest = max(limits)
+    kept = {}
+    for u, value in pairs:
+        keep = kept.get(u)
+        if keep is None:
+            h = hash64(u)
+            # Most users are rejected by the hash alone, without a lookup.
+            keep = kept[u] = h < highest and h < limits[index.lookup(u)]
+        if keep:
+            yield u, value
+
+
+def users_estimate(stats, rates):
+    """
+    Argument: stats -- dict of group -> (sampled users, sampled posts, sum of squared posts per sampled user)
+    Value: (estimated users of all groups, 95% half-width)
+    """
+    users = variance = 0.0
+    for g, (n, posts, squares) in stats.items():
+        r = rates[g]
+        users += n / r
+        variance += (1 - r) / r ** 2 * n
+    return users, Z95 * sqrt(variance)
+
+
+def post_estimates(stats, rates):
+    """
+    Argument: stats -- dict of group -> (sampled users, sampled posts, sum of squared posts per sampled user)
+    Value: list of (group, estimated posts, 95% half-width), by group
+    """
+    rows = []
+    for g in sorted(stats):
+        n, posts, squares = stats[g]
+        r = rates[g]
+        rows.append((g, posts / r, Z95 * sqrt((1 - r) / r ** 2 * squares)))
+    return rows
+
+
+class PreviewEstimate(object):
+    """
+    Argument: sample -- PopularityMatrix of the sampled user counts
+              rates -- sampling rate of every group
+    """
+    def __init__(self, sample, rates):
+        self.sample = sample
+        self.rates = np.asarray(rates, dtype=np.float64)
+        self.scale = (1.0 / self.rates)[:, None]
+        self.estimate = PopularityMatrix(sample.token_ids, sample.counts * self.scale)
+
+    def frequent(self, min_users):
+        """
+        Value: the estimate restricted to tokens estimated to be mentioned by
+               at least min_users users
+        """
+        keep = self.estimate.totals() >= min_users
+        return PreviewEstimate(PopularityMatrix(self.sample.token_ids[keep], self.sample.counts[:, keep]),
+                               self.rates)
+
+    def variances(self):
+        """
+        Value: groups x V array of the variance of every estimated count
+        """
+        return self.sample.counts * ((1 - self.rates) / self.rates ** 2)[:, None]
+
+    def top_overall(self, names, k):
+        """
+        Value: the k tokens estimated to be mentioned by most users, as
+               (token, N_t^all, 95% half-width, None)
+        """
+        halfwidth = dict(zip(self.estimate.token_ids.tolist(), (Z95 * np.sqrt(self.variances().sum(axis=0))).tolist()))
+        by_name = dict((names[t], t) for t in self.estimate.token_ids.tolist())
+        return [(t, n, halfwidth[by_name[t]], None) for t, n in self.estimate.top_overall(names, k)]
+
+    def popularity_halfwidths(self):
+        """
+        Value: groups x V array of the 95% half-width of every relative popularity
+        """
+        n = self.estimate.counts
+        v = self.variances()
+        total = n.sum(axis=0)
+        total_var = v.sum(axis=0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # d/dN_k of ln(N_k / N_all) is 1/N_k - 1/N_all, and -1/N_all for the other groups.
+            var = (1 / n - 1 / total) ** 2 * v + (total_var - v) / total ** 2
+        return Z95 * np.sqrt(var) / log(2)
+
+    def top_k(self, names, k, rounds=200, seed=0):
+        """
+        Value: (dict of group -> k (token, p, 95% half-width, share of the
+               bootstrap rounds that ranked the token in the top k),
+               dict of group -> mean overlap of the bootstrap and point top k)
+        """
+        tops = self.estimate.top_k(names, k)
+        point = dict((g, set(t for t, p in rows)) for g, rows in tops.items())
+        hits = dict((g, dict.fromkeys(point[g], 0)) for g in point)
+        overlap = dict.fromkeys(point, 0.0)
+        rng = np.random.RandomState(seed)
+        for _ in range(rounds):
+            counts = rng.poisson(self.sample.counts) * self.scale
+            boot = PopularityMatrix(self.estimate.token_ids, counts).top_k(names, k)
+            for g, rows in boot.items():
+                ranked = set(t for t, p in rows)
+                for t in ranked & point[g]:
+                    hits[g][t] += 1
+                if point[g]:
+                    overlap[g] += len(ranked & point[g]) / float(len(point[g]))
+        halfwidths = self.popularity_halfwidths()
+        column = dict((t, j) for j, t in enumerate(self.estimate.token_ids.tolist()))
+        by_name = dict((names[t], t) for t in self.estimate.token_ids.tolist())
+        rows = {}
+        for g, ranked in tops.items():
+            rows[g] = [(t, p, halfwidths[g, column[by_name[t]]], hits[g][t] / float(rounds)) for t, p in ranked]
+        return rows, dict((g, o / rounds) for g, o in overlap.items())
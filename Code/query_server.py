@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Answer popularity queries from a count index, without rerunning the pipeline.
+
+Usage: python query_server.py --index ../Data/counts-index [--port 8000 | --socket /tmp/tweets.sock]
+
+The index is written by `twitter_sentiment_analysis.py --index-out` (see
+count_index.py) and memory-mapped, so the server is up at once. Queries
+are HTTP GETs answered with JSON; answers to recent queries are kept in an
+LRU cache. The index only holds the tokens mentioned by at least the
+--min-users-floor of its run: lower min_users are refused, and rarer
+tokens are unknown.
+
+    /groups                             number of groups and tokens, and the lowest min_users
+    /top?group=3&k=10&min_users=50      the k most relatively popular tokens of a group
+    /overall?k=20&min_users=100         the k tokens mentioned by most users
+    /token?name=cruz                    users and popularity of a token in every group, and the leading group
+    /prefix?prefix=cru&limit=20         the tokens starting with a prefix
+"""
+
+import argparse
+import json
+import os
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from collections import OrderedDict
+from SocketServer import ThreadingMixIn, UnixStreamServer
+from urlparse import urlparse, parse_qs
+
+from count_index import CountIndex
+
+
+class LRUCache(object):
+    """
+    Thread-safe cache of the `size` most recently used values.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, compute):
+        with self.lock:
+            if key in self.items:
+                value = self.items.pop(key)
+                self.items[key] = value
+                return value
+        value = compute()
+        with self.lock:
+            self.items[key] = value
+            if len(self.items) > self.size:
+                self.items.popitem(last=False)
+        return value
+
+
+class QueryError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+
+class Queries(object):
+    """
+    Argument: index -- the CountIndex to query
+              unassigned_group -- group left out when picking the leading group
+    """
+    def __init__(self, index, unassigned_group, cache_size=1024):
+        self.index = index
+        self.unassigned_group = unassigned_group
+        self.cache = LRUCache(cache_size)
+        self.handlers = {'/groups': self.groups, '/top': self.top, '/overall': self.overall,
+                         '/token': self.token, '/prefix': self.prefix}
+
+    def answer(self, path):
+        """
+        Argument: path -- request path with its query string
+        Value: the JSON answer, as a string
+        Raise: QueryError on unknown paths and bad parameters
+        """
+        url = urlparse(path)
+        if url.path not in self.handlers:
+            raise QueryError(404, 'unknown query %s' % url.path)
+        params = dict((k, v[-1]) for k, v in parse_qs(url.query).items())
+        key = (url.path, tuple(sorted(params.items())))
+        return self.cache.get(key, lambda: json.dumps(self.handlers[url.path](params)))
+
+    def _int(self, params, name, default=None, low=0, high=None):
+        if name not in params:
+            if default is None:
+                raise QueryError(400, 'missing parameter %s' % name)
+            return default
+        try:
+            value = int(params[name])
+        except ValueError:
+            raise QueryError(400, 'parameter %s must be an integer' % name)
+        if value < low or (high is not None and value > high):
+            raise QueryError(400, 'parameter %s out of range' % name)
+        return value
+
+    def _text(self, params, name):
+        if not params.get(name):
+            raise QueryError(400, 'missing parameter %s' % name)
+        try:
+            return params[name].decode('utf-8')
+        except UnicodeDecodeError:
+            raise QueryError(400, 'parameter %s must be utf-8' % name)
+
+    def _min_users(self, params):
+        # Tokens below the threshold of the index are missing from it: no silently partial rankings.
+        min_users = self._int(params, 'min_users', max(100, self.index.min_users))
+        if min_users < self.index.min_users:
+            raise QueryError(400, 'parameter min_users must be at least %d, the threshold of the index'
+                             % self.index.min_users)
+        return min_users
+
+    def groups(self, params):
+        return {'groups': self.index.num_groups, 'tokens': len(self.index),
+                'unassigned_group': self.unassigned_group, 'min_users': self.index.min_users}
+
+    def top(self, params):
+        group = self._int(params, 'group', high=self.index.num_groups - 1)
+        k = self._int(params, 'k', 10)
+        min_users = self._min_users(params)
+        return {'group': group, 'min_users': min_users,
+                'tokens': self.index.top_k(group, k, min_users)}
+
+    def overall(self, params):
+        k = self._int(params, 'k', 20)
+        min_users = self._min_users(params)
+        return {'min_users': min_users, 'tokens': self.index.top_overall(k, min_users)}
+
+    def token(self, params):
+        name = self._text(params, 'name')
+        column = self.index.column(name)
+        if column is None:
+            raise QueryError(404, 'unknown token %s (the index holds the tokens of at least %d users)'
+                             % (name.encode('utf-8'), self.index.min_users))
+        return self.index.token(column, self.unassigned_group)
+
+    def prefix(self, params):
+        columns = self.index.prefixed(self._text(params, 'prefix'), self._int(params, 'limit', 20))
+        return {'tokens': [(self.index[c], int(self.index.totals[c])) for c in columns]}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            status, body = 200, self.server.queries.answer(self.path)
+        except QueryError as e:
+            status, body = e.status, json.dumps({'error': str(e)})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address.
+        return self.client_address[0] if self.client_address else self.server.server_address
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(queries, port=8000, host='127.0.0.1', unix_socket=None, quiet=False):
+    """
+    Serve queries over TCP on host:port, or on a Unix socket, until interrupted.
+    """
+    if unix_socket:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadingUnixHTTPServer(unix_socket, QueryHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+    server.queries = queries
+    server.quiet = quiet
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if unix_socket and os.path.exists(unix_socket):
+            os.remove(unix_socket)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve popularity queries from a count index.')
+    parser.add_argument('--index', required=True, help='directory written by twitter_sentiment_analysis.py --index-out')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on')
+    parser.add_argument('--port', type=int, default=8000, help='TCP port to listen on')
+    parser.add_argument('--socket', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--unassigned-group', type=int, default=None,
+                        help='group of the users in no partition, never the leading group (default: the last one)')
+    parser.add_argument('--cache-size', type=int, default=1024, help='number of answers kept in the LRU cache')
+    parser.add_argument('--quiet', action='store_true', help='do not log every request')
+    args = parser.parse_args()
+
+    index = CountIndex(args.index)
+    unassigned = args.unassigned_group if args.unassigned_group is not None else index.num_groups - 1
+    print 'Serving %d tokens of %d groups from %s on %s' % (len(index), index.num_groups, args.index,
+                                                           args.socket or '%s:%d' % (args.host, args.port))
+    serve(Queries(index, unassigned, args.cache_size), args.port, args.host, args.socket, args.quiet)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Output of the analysis, shared by the Spark and the local backends so that
+both print exactly the same report.
+"""
+
+
+def print_users_count(count):
+    print 'The number of unique users is:', count
+
+
+def print_dropped(broken, non_tweets, skipped, json_backend):
+    """
+    Argument: skipped -- list of (message type, lines) dropped before JSON decoding
+    """
+    counts = ['%d %s' % (n, name) for name, n in skipped if n]
+    print 'Skipped %s before JSON decoding' % (', '.join(counts) or '0 lines')
+    print 'Dropped %d broken lines and %d non-tweet messages (JSON backend: %s)' % (broken, non_tweets, json_backend)
+
+
+def print_post_count(counts):
+    for group_id, count in counts:
+        print 'Group %d posted %d tweets' % (group_id, count)
+
+
+def print_tokens(tokens, gid = None):
+    group_name = "overall"
+    if gid is not None:
+        group_name = "group %d" % gid
+    print '=' * 5 + ' ' + group_name + ' ' + '=' * 5
+    for t, n in tokens:
+        print "%s\t%.4f" % (t, n)
+    print
+
+
+def print_token_bounds(tokens, rse):
+    print '=' * 5 + ' overall (HyperLogLog, relative standard error %.2f%%) ' % (100 * rse) + '=' * 5
+    for t, n in tokens:
+        print "%s\t%.4f\t+/- %.1f" % (t, n, rse * n)
+    print
+
+
+def print_affinity(candidates, affinity, leaders):
+    """
+    Argument: candidates -- the candidate names
+              affinity -- groups x candidates array of log2 affinities
+              leaders -- (leading group, margin or None) of every candidate
+    """
+    print '=' * 5 + ' candidate affinity (log2 share of mentions over the group share) ' + '=' * 5
+    print 'group\t' + '\t'.join(candidates)
+    for g, row in enumerate(affinity):
+        # NaN: the group mentions none of the frequent tokens.
+        print '%d\t' % g + '\t'.join('%.4f' % a if a == a else '-' for a in row)
+    print 'leader\t' + '\t'.join('%d' % g for g, margin in leaders)
+    print 'margin\t' + '\t'.join('-' if margin is None else '%.4f' % margin for g, margin in leaders)
+    print
+
+
+def print_supporters(users_support):
+    for gid, candidate in users_support:
+        print "Users from group %d are most likely to support %s." % (gid, candidate)
+
+
+def print_window(label, tokens):
+    print '#' * 5 + ' window %s (%d tokens) ' % (label, tokens) + '#' * 5
+    print
+
+
+def print_users_estimate(count, halfwidth):
+    print 'The number of unique users is about %d (+/- %d)' % (round(count), round(halfwidth))
+
+
+def print_post_estimates(rows):
+    for group_id, count, halfwidth in rows:
+        print 'Group %d posted about %d tweets (+/- %d)' % (group_id, round(count), round(halfwidth))
+
+
+def print_token_intervals(tokens, gid = None):
+    """
+    Argument: tokens -- (token, value, 95% half-width, share of bootstrap top-k, or None)
+    """
+    group_name = "overall"
+    if gid is not None:
+        group_name = "group %d" % gid
+    print '=' * 5 + ' ' + group_name + ' (preview, 95% intervals) ' + '=' * 5
+    for t, n, halfwidth, share in tokens:
+        if share is None:
+            print "%s\t%.4f\t+/- %.4f" % (t, n, halfwidth)
+        else:
+            print "%s\t%.4f\t+/- %.4f\tin top %3.0f%%" % (t, n, halfwidth, 100 * share)
+
+
+def print_stability(overlap, k):
+    print 'Top-%d stability: %.0f%% of the preview top %d on average in bootstrap resamples' % (k, 100 * overlap, k)
+    print
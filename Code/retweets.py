@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Every retweeted text tokenized once, instead of once per retweeter.
+
+Most of the stream is retweets, whose text is "RT @author: " followed by
+the original text, repeated verbatim for every retweeter. Retweets are
+keyed by the id of the retweeted tweet (`retweet_of`, from
+`retweeted_status.id_str`) and a hash of their own text, so all retweets of
+an original share one key; the hash only tells apart the rare variants,
+e.g. after the author changed their screen name. Each key is tokenized
+once, and its token id set goes back to every retweeter: with a broadcast
+for the originals retweeted most, with a join for the rest. Original
+tweets keep their text and are tokenized in the per-user pass, which
+passes the retweets' id sets on as they are (`tokenize_originals`).
+The names of the retweeted tokens are kept by the same tokenization, as
+the last record of every partition of the contents (see token_ids.py).
+
+Every tweet still gets exactly the token ids of its own text, so the
+per-user distinct-token counts are unchanged, while the tokenizer work
+follows the number of distinct texts instead of the number of tweets.
+"""
+
+from happyfuntokenizing import FastTokenizer
+from hyperloglog import hash64
+from token_ids import named_token_ids
+
+# At most this many originals are broadcast; the rest are joined.
+BROADCAST_LIMIT = 10000
+
+
+def content_key(text, retweet_of):
+    return retweet_of, hash64(text)
+
+
+def retweet_contents(tweets, tokenized):
+    """
+    Argument: tweets -- RDD of (user_id, (text, retweet_of or None))
+              tokenized -- (partition index, (key, text) pairs) -> (key, tokens)
+    Value: RDD of (content key, (token id set, number of retweets)), one per
+           distinct retweeted text, and at the end of every partition a
+           (None, vocabulary) record of the names of its tokens (see token_ids.names_of)
+    """
+    texts = tweets.filter(lambda (u, (t, r)): r is not None).map(
+        lambda (u, (t, r)): (content_key(t, r), (t, 1)))
+    counted = texts.reduceByKey(lambda (t, n), (t1, n1): (t, n + n1))
+
+    def tokenize(pid, pairs):
+        pairs = list(pairs)
+        retweets = dict((k, n) for k, (t, n) in pairs)
+        vocabulary = {}
+        for k, ids in named_token_ids(tokenized(pid, ((k, t) for k, (t, n) in pairs)), vocabulary):
+            yield k, (ids, retweets[k])
+        yield None, vocabulary
+
+    return counted.mapPartitionsWithIndex(tokenize)
+
+
+def popular_contents(contents, min_retweets, limit=BROADCAST_LIMIT):
+    """
+    Value: dict of content key -> token id set of the (at most `limit`) texts
+           retweeted at least min_retweets times
+    """
+    popular = contents.filter(lambda (k, (ids, n)): n >= min_retweets)
+    return dict((k, ids) for k, (ids, n) in popular.takeOrdered(limit, key=lambda (k, (ids, n)): -n))
+
+
+def tweet_token_ids(tweets, contents, popular):
+    """
+    Argument: tweets -- RDD of (user_id, (text, retweet_of or None))
+              contents -- the (content key, (token id set, retweets)) of retweet_contents
+              popular -- broadcast of the output of popular_contents
+    Value: RDD of (user_id, text) of every original tweet and (user_id,
+           token id set) of every retweet
+    """
+    originals = tweets.filter(lambda (u, (t, r)): r is None).map(lambda (u, (t, r)): (u, t))
+    retweets = tweets.filter(lambda (u, (t, r)): r is not None).map(lambda (u, (t, r)): (content_key(t, r), u))
+    broadcast = retweets.filter(lambda (k, u): k in popular.value).map(lambda (k, u): (u, popular.value[k]))
+    joined = retweets.filter(lambda (k, u): k not in popular.value).join(
+        contents.mapValues(lambda (ids, n): ids)).values()
+    return originals.union(broadcast).union(joined)
+
+
+def tokenize_originals(pairs, cache_size=10000):
+    """
+    Tokenize the texts of a partition of tweet_token_ids pairs with one
+    FastTokenizer, and pass the token id sets of the retweets on as they are.
+    """
+    tokenizer = FastTokenizer(cache_size)
+    for u, value in pairs:
+        yield u, value if isinstance(value, set) else tokenizer.tokenize(value)
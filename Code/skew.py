@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Per-user token sets that do not put a heavy poster's whole stream into one
+task.
+
+A few bots post orders of magnitude more than everyone else, and keying the
+union of token sets by user alone sends all their tweets to a single reduce
+task. The users estimated from a sample to post more than a threshold have
+their tweets spread over several partitions (see per_user.py), and their
+partial token sets are merged under `buckets` sub-keys (user, token id %
+buckets). A token always lands in the same bucket, so the buckets of a user
+hold disjoint token sets. Each (user, token) pair is still counted exactly
+once when the (group, token) counts are computed from the buckets. Bucket 0
+is always emitted, so every user has exactly one (user, 0) key.
+
+Sets are merged in place (combineByKey), rather than allocating a new set on
+every merge like `t.union(t1)`.
+"""
+
+from operator import add
+
+
+def hot_keys(sample, fraction, partitions, min_count=None):
+    """
+    Argument: sample -- RDD of the key of every record in a sample of the records
+              fraction -- share of the records in the sample
+              partitions -- number of partitions the records are spread over
+              min_count -- estimated number of records from which a key is hot
+                           (default: half the average records per partition, at least 1000)
+    Value: dict of hot key -> estimated number of records
+    """
+    # Counted and filtered on the executors: only the hot keys reach the driver.
+    counts = sample.map(lambda k: (k, 1)).reduceByKey(add)
+    if min_count is None:
+        # Read twice: cached, so the sample is not drawn (and the input parsed) again.
+        counts.persist()
+        min_count = max(1000, counts.values().sum() / fraction / (2 * partitions))
+    threshold = min_count * fraction
+    hot = dict((k, c / fraction) for k, c in counts.filter(lambda (k, c): c >= threshold).collect())
+    counts.unpersist()
+    return hot
+
+
+def salted_token_sets(pairs, hot, buckets):
+    """
+    Argument: pairs -- iterable of (user, token id set), one per tweet
+              hot -- collection of the users to split
+    Value: generator of ((user, bucket), token id set)
+    """
+    for u, ids in pairs:
+        if u in hot:
+            split = {0: set()}
+            for i in ids:
+                b = i % buckets
+                if b in split:
+                    split[b].add(i)
+                else:
+                    split[b] = set([i])
+            for b, s in split.iteritems():
+                yield (u, b), s
+        else:
+            yield (u, 0), ids
+
+
+def union_sets():
+    """
+    combineByKey functions that union sets in place.
+    """
+    def create(ids):
+        return ids
+
+    def add(ids, other):
+        ids |= other
+        return ids
+
+    return create, add, add
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Streaming mode: follow a directory the collector keeps writing tweet files
+into, and refresh the report after every micro-batch of new files.
+
+Only the new files of a batch are parsed and tokenized (on the same worker
+pool as the local backend, see local_engine.py). The parent keeps every
+user's group and token id set, so for each user of the batch only the token
+ids that user had never mentioned before add one to their (group, token)
+count: a batch costs time proportional to its own size, not to the corpus.
+The counts live in a growing groups x tokens NumPy matrix, from which the
+top-k is re-ranked after each batch.
+
+A file is picked up once its size stayed the same over two polls, so files
+still being written are not read half-way. Names starting with '.' or '_'
+are ignored, which lets the collector write to a temporary name and rename.
+"""
+
+import glob
+import multiprocessing
+import os
+import time
+from collections import Counter
+
+import numpy as np
+
+from affinity import DEFAULT_CANDIDATES
+from local_engine import user_tokens, read_lines, chunks, print_rankings
+from popularity import PopularityMatrix
+from reporting import print_users_count, print_dropped
+from tweet_parser import json_backend, SKIPPED_TYPES
+from user_partition import PartitionIndex, index_from_pickle
+
+
+class DirectoryWatcher(object):
+    """
+    Argument: directory -- directory to watch
+              pattern -- glob of the tweet files in it
+    """
+    def __init__(self, directory, pattern='*'):
+        self.directory = directory
+        self.pattern = pattern
+        self.seen = set()
+        self.sizes = {}
+
+    def poll(self):
+        """
+        Value: sorted list of the files that are complete and were not returned before
+        """
+        ready = []
+        for path in sorted(glob.glob(os.path.join(self.directory, self.pattern))):
+            if path in self.seen or os.path.basename(path)[:1] in ('.', '_') or not os.path.isfile(path):
+                continue
+            size = os.path.getsize(path)
+            if self.sizes.get(path) == size:
+                del self.sizes[path]
+                self.seen.add(path)
+                ready.append(path)
+            else:
+                self.sizes[path] = size
+        return ready
+
+
+class StreamState(object):
+    """
+    Distinct users per (group, token), maintained incrementally.
+    """
+    def __init__(self, index, num_groups):
+        self.index = index
+        self.num_groups = num_groups
+        self.user_groups = {}
+        self.user_tokens = {}
+        self.columns = {}
+        self.token_ids = np.zeros(1024, dtype=np.int64)
+        self.counts = np.zeros((num_groups, 1024), dtype=np.int64)
+        self.group_posts = np.zeros(num_groups, dtype=np.int64)
+        self.names = {}
+        self.lines = self.broken = self.non_tweets = 0
+        self.skipped = Counter()
+
+    def _column(self, token_id):
+        col = self.columns.get(token_id)
+        if col is None:
+            col = len(self.columns)
+            if col == len(self.token_ids):
+                self.token_ids = np.concatenate([self.token_ids, np.zeros_like(self.token_ids)])
+                self.counts = np.concatenate([self.counts, np.zeros_like(self.counts)], axis=1)
+            self.columns[token_id] = col
+            self.token_ids[col] = token_id
+        return col
+
+    def update(self, chunk):
+        """
+        Argument: chunk -- the result of local_engine.user_tokens on a chunk of lines
+        """
+        n, broken, non_tweets, skipped, posts, tokens, names = chunk
+        self.lines += n
+        self.broken += broken
+        self.non_tweets += non_tweets
+        self.skipped.update(skipped)
+        self.names.update(names)
+
+        new_users = [u for u in posts if u not in self.user_groups]
+        if new_users:
+            groups = self.index.lookup_many([int(u) for u in new_users])
+            self.user_groups.update(zip(new_users, groups.tolist()))
+        for u, c in posts.iteritems():
+            self.group_posts[self.user_groups[u]] += c
+
+        rows, cols = [], []
+        for u, ids in tokens.iteritems():
+            known = self.user_tokens.get(u)
+            if known is None:
+                self.user_tokens[u] = new = ids
+            else:
+                new = ids - known
+                known |= new
+            if new:
+                rows.extend([self.user_groups[u]] * len(new))
+                cols.extend(self._column(i) for i in new)
+        np.add.at(self.counts, (np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)), 1)
+
+    def matrix(self):
+        n = len(self.columns)
+        return PopularityMatrix(self.token_ids[:n], self.counts[:, :n])
+
+
+def run_streaming(directory, partition_path, num_groups=8, min_users=100, top_k=10,
+                  workers=None, pattern='*', interval=10.0, max_batches=None, chunk_lines=2000,
+                  candidates=DEFAULT_CANDIDATES):
+    """
+    Watch `directory` and print the report over everything read so far after
+    every batch of new files, until interrupted or after max_batches batches.
+    Value: the StreamState
+    """
+    index = PartitionIndex.load(index_from_pickle(partition_path), num_groups - 1)
+    state = StreamState(index, num_groups)
+    watcher = DirectoryWatcher(directory, pattern)
+    pool = multiprocessing.Pool(workers)
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            files = watcher.poll()
+            if not files:
+                time.sleep(interval)
+                continue
+            batches += 1
+            start = time.time()
+            lines = state.lines
+            for chunk in pool.imap(user_tokens, chunks(read_lines(files), chunk_lines)):
+                state.update(chunk)
+            print '=' * 5 + ' batch %d: %d files, %d lines in %.1fs ' % (
+                batches, len(files), state.lines - lines, time.time() - start) + '=' * 5
+            print 'Number of elements:', state.lines
+            print_users_count(len(state.user_groups))
+            print_dropped(state.broken, state.non_tweets, [(name, state.skipped[name]) for name in SKIPPED_TYPES],
+                          json_backend)
+            print_rankings(state.group_posts, state.matrix(), state.names, min_users, top_k, candidates)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pool.close()
+        pool.join()
+    return state
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Dictionary encoding of tokens as stable 64-bit integer ids.
+
+Shuffling and caching ints is much cheaper than pickled unicode strings,
+so the per-user and per-group stages only move token ids around. The id
+is derived from the token itself (the first 8 bytes of its MD5 digest),
+so every executor computes the same id without a shared vocabulary, and
+the strings only have to be recovered for the few tokens that are printed.
+Those names are kept by the pass that tokenizes the texts, one vocabulary
+per partition (named_token_ids), and looked up at print time.
+"""
+
+import hashlib
+import struct
+
+_int64 = struct.Struct('<q')
+
+
+def token_id(token):
+    """
+    Argument: token -- a unicode token
+    Value: signed 64-bit integer id of the token
+    """
+    return _int64.unpack(hashlib.md5(token.encode('utf-8')).digest()[:8])[0]
+
+
+def token_id_set(tokens):
+    return set(token_id(t) for t in set(tokens))
+
+
+def named_token_ids(pairs, vocabulary):
+    """
+    Token id sets that also keep the name of every token, so the names do
+    not have to be recovered by tokenizing the texts again.
+
+    Argument: pairs -- (key, tokens) of one partition; values that already are
+                       token id sets (see retweets.py) are passed on as they are
+              vocabulary -- dict of token -> token id, completed with the tokens of pairs
+    Value: generator of (key, token id set)
+    """
+    for key, tokens in pairs:
+        if isinstance(tokens, set):
+            yield key, tokens
+            continue
+        ids = set()
+        for t in tokens:
+            i = vocabulary.get(t)
+            if i is None:
+                i = vocabulary[t] = token_id(t)
+            ids.add(i)
+        yield key, ids
+
+
+def names_of(records):
+    """
+    Argument: records -- RDD in which every partition ends with a
+                         (None, vocabulary) record of named_token_ids
+    Value: RDD of (token id, token), once per partition the token is in
+    """
+    return records.filter(lambda (k, v): k is None).flatMap(
+        lambda (k, vocabulary): [(i, t) for t, i in vocabulary.iteritems()])
+
+
+def lookup_names(names, ids):
+    """
+    Reverse map of the requested token ids, used only at print time.
+
+    Argument: names -- RDD of (token id, token), as from names_of
+              ids -- iterable of token ids to resolve
+    Value: dict of token id -> token
+    """
+    wanted = names.context.broadcast(set(ids))
+    return names.filter(lambda (i, t): i in wanted.value).reduceByKey(lambda a, b: a).collectAsMap()
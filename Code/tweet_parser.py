@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Single-pass parsing of the raw tweet stream.
+
+Every line is decoded exactly once and projected down to the few fields
+the analysis needs. Broken lines (invalid JSON) and stream messages that
+are not tweets (limit notices, delete notices, ...) are dropped here and
+counted through Spark accumulators, so the rest of the pipeline only ever
+sees clean (user_id, text) records. Most non-tweets never get decoded:
+`prefilter` recognises them from the raw bytes.
+"""
+
+import calendar
+from collections import namedtuple
+
+# Pick the fastest JSON decoder that is installed. All of them raise a
+# ValueError subclass on broken input, which is all parse_tweets relies on.
+try:
+    import ujson as _json
+except ImportError:
+    try:
+        import simplejson as _json
+    except ImportError:
+        import json as _json
+
+json_backend = _json.__name__
+loads = _json.loads
+
+Tweet = namedtuple('Tweet', ['user_id', 'text', 'created_at', 'entities', 'retweet_of'])
+
+# Stream messages that are not tweets, told apart by the start of the raw line.
+MESSAGE_PREFIXES = (
+    ('limit', '{"limit"'),
+    ('delete', '{"delete"'),
+    ('scrub_geo', '{"scrub_geo"'),
+    ('status_withheld', '{"status_withheld"'),
+    ('user_withheld', '{"user_withheld"'),
+    ('disconnect', '{"disconnect"'),
+    ('warning', '{"warning"'),
+)
+# What prefilter counts: the message types above, and other lines without a "text" key.
+SKIPPED_TYPES = tuple(name for name, prefix in MESSAGE_PREFIXES) + ('no_text',)
+_prefixes = tuple(prefix for name, prefix in MESSAGE_PREFIXES)
+
+
+def prefilter(lines, skipped=None):
+    """
+    Drop the lines that cannot be tweets before they reach the JSON decoder:
+    control messages recognised by their prefix, and any line that does not
+    even contain the bytes '"text"'.
+
+    Argument: lines -- iterable of raw JSON byte strings
+              skipped -- optional dict of SKIPPED_TYPES -> accumulator
+    Value: generator of the remaining lines
+    """
+    for line in lines:
+        if line.startswith(_prefixes):
+            if skipped is not None:
+                for name, prefix in MESSAGE_PREFIXES:
+                    if line.startswith(prefix):
+                        skipped[name].add(1)
+                        break
+            continue
+        if '"text"' not in line:
+            if skipped is not None:
+                skipped['no_text'].add(1)
+            continue
+        yield line
+
+_months = dict((m, i) for i, m in enumerate(calendar.month_abbr) if m)
+# Memo of "Mon DD YYYY" -> epoch seconds at midnight UTC of that day.
+_day_starts = {}
+
+
+def parse_created_at(created_at):
+    """
+    Argument: created_at -- Twitter timestamp, e.g. "Wed Aug 27 13:08:45 +0000 2008"
+    Value: seconds since the epoch (UTC)
+    Raise: ValueError when created_at is not such a timestamp
+
+    The format is fixed-width, so fields are sliced out directly instead of
+    going through time.strptime.
+    """
+    if not isinstance(created_at, basestring) or len(created_at) < 30:
+        raise ValueError('malformed created_at: %r' % (created_at,))
+    day = created_at[4:10] + created_at[25:]
+    try:
+        start = _day_starts[day]
+    except KeyError:
+        try:
+            start = calendar.timegm((int(created_at[26:30]), _months[created_at[4:7]], int(created_at[8:10]), 0, 0, 0))
+        except KeyError:
+            raise ValueError('unknown month in created_at: %r' % created_at)
+        _day_starts[day] = start
+    offset = int(created_at[21:23]) * 3600 + int(created_at[23:25]) * 60
+    if created_at[20] == '-':
+        offset = -offset
+    return start + int(created_at[11:13]) * 3600 + int(created_at[14:16]) * 60 + int(created_at[17:19]) - offset
+
+
+def parse_tweets(lines, broken=None, non_tweets=None, with_extras=False):
+    """
+    Argument: lines -- iterable of raw JSON strings (one partition)
+              broken, non_tweets -- optional accumulators for dropped lines
+              with_extras -- also keep created_at, entities and the id of the
+                             retweeted tweet (retweet_of)
+    Value: generator of Tweet records with utf-8 encoded user_id and text
+    """
+    for raw_json in lines:
+        try:
+            obj = loads(raw_json)
+        except ValueError:
+            if broken is not None:
+                broken.add(1)
+            continue
+        if not isinstance(obj, dict) or 'text' not in obj or 'user' not in obj:
+            if non_tweets is not None:
+                non_tweets.add(1)
+            continue
+        created_at = entities = retweet_of = None
+        if with_extras:
+            created_at = obj.get('created_at')
+            entities = obj.get('entities')
+            retweeted = obj.get('retweeted_status')
+            if retweeted:
+                retweet_of = retweeted['id_str'].encode('utf-8')
+        yield Tweet(obj['user']['id_str'].encode('utf-8'),
+                    obj['text'].encode('utf-8'),
+                    created_at, entities, retweet_of)
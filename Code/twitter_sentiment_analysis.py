@@ -1,9 +1,191 @@
 # -*- coding: utf-8 -*-
 # __author__ = Srinath Narayanan
 
+import os
+import sys
+import argparse
+
+parser = argparse.ArgumentParser(description='Relative popularity of tokens in Twitter user partitions.')
+parser.add_argument('--input', default='../Data/data_input.txt',
+                    help='file listing the raw tweet files, one per line, or directories, globs or files, '
+                         'comma-separated (.gz, .bz2 and .zst are decompressed; see inputs.py). Remote paths '
+                         '(hdfs://, s3a://) are packed into splits by Hadoop and only decompressed by its codecs')
+parser.add_argument('--split-size', type=int, default=128,
+                    help='cut plain input files into pieces of at most this many MB (remote files: '
+                         'pack them into splits of at most this many MB on disk)')
+parser.add_argument('--input-partitions', type=int, default=None,
+                    help='partitions of the raw lines of the local input files (default: one per --split-size)')
+parser.add_argument('--partition', default='../Data/users-partition.pickle',
+                    help='pickled {user_id: partition_id} dictionary')
+parser.add_argument('--backend', choices=['spark', 'local'], default='spark',
+                    help='run on Spark, or on a local process pool for inputs that fit on one machine')
+parser.add_argument('--workers', type=int, default=None,
+                    help='number of worker processes of the local backend (default: one per CPU)')
+parser.add_argument('--watch',
+                    help='with --backend local, follow this directory and refresh the report after every '
+                         'batch of new tweet files (see streaming.py)')
+parser.add_argument('--watch-pattern', default='*', help='glob of the tweet files in the --watch directory')
+parser.add_argument('--interval', type=float, default=10.0, help='seconds between polls of the --watch directory')
+parser.add_argument('--max-batches', type=int, default=None, help='stop --watch after this many batches')
+parser.add_argument('--num-groups', type=int, default=8,
+                    help='number of user groups, including the last one for users not in any partition')
+parser.add_argument('--top-k', type=int, default=10,
+                    help='number of tokens printed per group in Part 3(3)')
+parser.add_argument('--min-users', type=int, default=100,
+                    help='only keep tokens mentioned by at least this many users in Part 3(2)')
+parser.add_argument('--min-users-floor', type=int, default=None,
+                    help='tokens mentioned by fewer users are not collected to the driver; '
+                         'thresholds down to this value need no recomputation (default: 10, or --min-users if lower)')
+parser.add_argument('--user-partitions', type=int, default=None,
+                    help='partitions of the tweets once partitioned by user (default: as many as the input)')
+parser.add_argument('--salt-buckets', type=int, default=16,
+                    help='spread the tweets of heavy posters over this many tasks (0: never split)')
+parser.add_argument('--hot-user-posts', type=int, default=None,
+                    help='users estimated to post at least this much are split '
+                         '(default: half the average tweets per partition, at least 1000)')
+parser.add_argument('--hot-sample', type=float, default=0.01,
+                    help='share of the tweets sampled to find heavy posters')
+parser.add_argument('--dedup-retweets', action='store_true',
+                    help='tokenize every retweeted text once and share its tokens with all retweeters '
+                         '(see retweets.py)')
+parser.add_argument('--broadcast-retweets', type=int, default=1000,
+                    help='with --dedup-retweets, texts retweeted at least this often are broadcast instead of joined')
+parser.add_argument('--approx-users', action='store_true',
+                    help='count distinct users per (group, token) with HyperLogLog sketches '
+                         'instead of materializing every user\'s token set')
+parser.add_argument('--hll-precision', type=int, default=12,
+                    help='HyperLogLog sketches use 2^p registers (relative error about 1.04/sqrt(2^p))')
+parser.add_argument('--parquet',
+                    help='read tweets from a Parquet dataset written by ingest.py instead of the raw JSON')
+parser.add_argument('--since', help='with --parquet, first UTC day to analyse (YYYY-MM-DD)')
+parser.add_argument('--until', help='with --parquet, last UTC day to analyse (YYYY-MM-DD)')
+parser.add_argument('--user-ids-file', help='with --parquet, only analyse the users listed in this file')
+parser.add_argument('--entities', action='store_true',
+                    help='rank the hashtags, mentions and url domains of the tweet entities instead of '
+                         'the tokenized text (see entities.py)')
+parser.add_argument('--window',
+                    help='also rank the tokens of every group per time window of this length (e.g. 1h, 1d), '
+                         'by created_at (see windows.py)')
+parser.add_argument('--slide', help='start a --window every this long (e.g. 15m) instead of back to back')
+parser.add_argument('--window-min-users', type=int, default=10,
+                    help='only rank tokens mentioned by at least this many users in a window')
+parser.add_argument('--preview', type=float, default=None,
+                    help='preview the report from this share of the users of every group, with 95%% '
+                         'confidence intervals and top-k stability (see preview.py)')
+parser.add_argument('--preview-min-users', type=int, default=200,
+                    help='sample groups more heavily when needed to get about this many users of each')
+parser.add_argument('--preview-rounds', type=int, default=200,
+                    help='bootstrap rounds of the top-k stability in the preview')
+parser.add_argument('--persist', choices=['memory', 'memory-and-disk', 'disk', 'low-memory'],
+                    default='memory-and-disk',
+                    help='storage of the cached raw lines, tweets and token counts (see persistence.py); '
+                         'low-memory keeps only the token counts in executor memory')
+parser.add_argument('--checkpoint-dir',
+                    help='keep the parsed counts, per-user token sets and per-token counts under this directory '
+                         'and reuse them in later runs over the same input (see checkpoints.py)')
+parser.add_argument('--candidates',
+                    help='JSON object of candidate name -> aliases (whole tokens, with or without a leading # or @) to score the groups '
+                         'against (see affinity.py; default: Bernie Sanders, Ted Cruz and Donald Trump)')
+parser.add_argument('--index-out',
+                    help='also write the user counts of every collected token (those of at least --min-users-floor '
+                         'users), with its name, to this directory for query_server.py (see count_index.py)')
+parser.add_argument('--metrics-out',
+                    help='write the time, record counts and dropped records of every stage to this JSON file')
+parser.add_argument('--tokenizer-histogram', action='store_true',
+                    help='also record per-partition histograms of the tokenization time of each tweet')
+args = parser.parse_args()
+if args.min_users_floor is None:
+    # The long tail (every t.co link is a token of its own) stays on the cluster.
+    args.min_users_floor = min(10, args.min_users)
+if args.min_users < args.min_users_floor:
+    parser.error('--min-users must not be below --min-users-floor')
+if args.backend == 'local' and (args.approx_users or args.parquet or args.window or args.entities or args.preview
+                                or args.dedup_retweets):
+    parser.error('--approx-users, --parquet, --window, --entities, --preview and --dedup-retweets need the Spark backend')
+if args.window:
+    from windows import Windows, parse_duration
+    try:
+        wins = Windows(parse_duration(args.window), parse_duration(args.slide) if args.slide else None)
+    except ValueError as e:
+        parser.error(str(e))
+elif args.slide:
+    parser.error('--slide needs --window')
+if args.entities and (args.parquet or args.tokenizer_histogram):
+    parser.error('--entities reads the raw JSON and does not tokenize: no --parquet or --tokenizer-histogram')
+if args.entities and args.dedup_retweets:
+    parser.error('--dedup-retweets only applies to the tokenized text, not to --entities')
+if args.preview is not None and not 0 < args.preview <= 1:
+    parser.error('--preview must be a share of the users, in (0, 1]')
+if args.preview and (args.approx_users or args.window or args.index_out):
+    parser.error('--preview does not combine with --approx-users, --window or --index-out')
+if args.watch and args.backend != 'local':
+    parser.error('--watch needs --backend local')
+if args.watch and args.index_out:
+    parser.error('--index-out is written by batch runs, not with --watch')
+if args.backend == 'local' and (args.metrics_out or args.tokenizer_histogram):
+    parser.error('--metrics-out and --tokenizer-histogram need the Spark backend')
+
+# Users who are not in any partition are assigned to the last group.
+unassigned_group = args.num_groups - 1
+
+from affinity import DEFAULT_CANDIDATES, load_candidates
+candidates = DEFAULT_CANDIDATES
+if args.candidates:
+    try:
+        candidates = load_candidates(args.candidates)
+    except (IOError, ValueError) as e:
+        parser.error('--candidates: %s' % e)
+
+if args.backend == 'local':
+    # The same pipeline and report without a JVM (see local_engine.py).
+    if args.watch:
+        from streaming import run_streaming
+        run_streaming(args.watch, args.partition, args.num_groups, args.min_users, args.top_k, args.workers,
+                      args.watch_pattern, args.interval, args.max_batches, candidates=candidates)
+        sys.exit(0)
+    from local_engine import run_local
+    run_local(args.input, args.partition, args.num_groups, args.min_users, args.top_k, args.workers,
+              index_out=args.index_out, candidates=candidates)
+    sys.exit(0)
+
 from pyspark import SparkContext
 sc = SparkContext()
 
+# Helper modules living next to this script are shipped to the executors.
+code_dir = os.path.dirname(os.path.abspath(__file__))
+for module in ['tweet_parser.py', 'user_partition.py', 'popularity.py', 'token_ids.py', 'hyperloglog.py',
+               'happyfuntokenizing.py', 'columnar.py', 'reporting.py', 'metrics.py', 'windows.py', 'skew.py', 'entities.py', 'preview.py', 'per_user.py',
+               'retweets.py', 'affinity.py', 'inputs.py']:
+    sc.addPyFile(os.path.join(code_dir, module))
+
+# Wall-clock time and record counts of every stage (see metrics.py); written out with --metrics-out.
+from metrics import PipelineMetrics, timed_tokenize_partition
+metrics = PipelineMetrics(sc)
+
+# Storage levels of the cached intermediates, released as soon as they are no longer needed.
+from persistence import PersistencePlan
+plan = PersistencePlan(args.persist)
+
+# With --checkpoint-dir, intermediates already computed over the same input, partition and
+# tokenizer are read back instead of recomputed.
+from checkpoints import Checkpoints, checkpoint_key
+if not args.parquet:
+    # The input files, cut and binned into partitions of about the same size (see inputs.py).
+    from inputs import InputPlan
+    inputplan=InputPlan(args.input, args.input_partitions, args.split_size*1024*1024,
+                        min_partitions=sc.defaultParallelism)
+ckpt_key=None
+if args.checkpoint_dir:
+    if args.parquet:
+        ckpt_inputs=[args.parquet]+([args.user_ids_file] if args.user_ids_file else [])
+    else:
+        ckpt_inputs=inputplan.files
+    ckpt_key=checkpoint_key(ckpt_inputs, args.partition,
+                            [args.since, args.until, args.num_groups, args.approx_users,
+                             args.hll_precision if args.approx_users else None, args.entities,
+                             args.preview, args.preview_min_users if args.preview else None])
+ckpt = Checkpoints(sc, args.checkpoint_dir, ckpt_key)
+
 # The data is represented as rows of of JSON strings.
 # It consists of [tweets](https://dev.twitter.com/overview/api/tweets), [messages](https://dev.twitter.com/streaming/overview/messages-types), and a small amount of broken data (cannot be parsed as JSON).
 
@@ -43,7 +225,13 @@ sc = SparkContext()
 # 
 
 def print_count(rdd):
-    print 'Number of elements:', rdd.count()
+    n = rdd.count()
+    print 'Number of elements:', n
+    return n
+
+# The other print functions are shared with the local backend (see reporting.py).
+from reporting import print_users_count, print_dropped, print_post_count, print_tokens, print_token_bounds, print_affinity, print_supporters, print_window
+from reporting import print_users_estimate, print_post_estimates, print_token_intervals, print_stability
 
 # If Spark is run locally, we require findspark
 # import findspark
@@ -51,16 +239,35 @@ def print_count(rdd):
 # from pyspark import SparkContext
 # sc = SparkContext(master="local[4]")
 
-# This path should be wherever we store the data
-data_path = "../Data/data_input.txt"
-all_files=open(data_path,"r")
-lines=[line.strip() for line in all_files.readlines()]
-text=sc.textFile(','.join(lines)).map(lambda t: t.encode('utf-8')).cache()
-print_count(text)
+metrics.begin('load')
+line_count=None
+if args.parquet:
+    # The tweets were already parsed into a columnar copy by ingest.py; only the needed
+    # columns, days and users are read from it (see columnar.py).
+    from pyspark.sql import SQLContext
+    from columnar import load_tweets, user_text_pairs, user_retweet_pairs
+    user_ids=None
+    if args.user_ids_file:
+        user_ids=[int(line) for line in open(args.user_ids_file) if line.strip()]
+    sqlContext=SQLContext(sc)
+    columns=('user_id','text','retweet_of') if args.dedup_retweets else ('user_id','text')
+    tweetsdf=load_tweets(sqlContext,args.parquet,columns=columns,since=args.since,until=args.until,user_ids=user_ids)
+else:
+    if inputplan.bins:
+        sizes=inputplan.bin_sizes()
+        print 'Planned %d input files (about %.1f MB) into %d partitions of %.1f to %.1f MB' % (
+            len(inputplan.files)-len(inputplan.remote), inputplan.size/1e6, len(sizes), min(sizes)/1e6, max(sizes)/1e6)
+    if inputplan.remote:
+        print 'Packing %d remote input files into splits of at most %d MB with Hadoop' % (len(inputplan.remote), args.split_size)
+    # Raw utf-8 bytes, as the JSON decoder and the prefilter take them: no decode and re-encode.
+    text=plan.persist('raw',inputplan.rdd(sc))
+    line_count=ckpt.remember('line_count',text.count)
+    print 'Number of elements:', line_count
+metrics.end('load', records_out=line_count)
 
 
 # # Part 1: Parse JSON strings to JSON objects
-import json
+from tweet_parser import parse_tweets, prefilter, json_backend, SKIPPED_TYPES
 
 # ## Broken tweets and irrelevant messages
 # 
@@ -70,22 +277,123 @@ import json
 # 
 # (1) Parse raw JSON tweets to obtain valid JSON objects. From all valid tweets, construct a pair RDD of `(user_id, text)`, where `user_id` is the `id_str` data field of the `user` dictionary (read [Tweets](#Tweets) section above), `text` is the `text` data field.
 
-def safe_parse(raw_json):
-    # your code here
-    try:
-        json_object = json.loads(raw_json)
-    except ValueError, e:
-        return False
-    if('text' not in json_object and 'id_str' not in json_object):
-        return False
-    return True
-    #pass
-
-def keypair(raw_json_string):
-    k=json.loads(raw_json_string)
-    return (k['user']['id_str'].encode('utf-8'),k['text'].encode('utf-8'))
-    
-validtext=text.filter(safe_parse).map(keypair).cache()
+# Each line is decoded once per partition by `parse_tweets` (see tweet_parser.py), which
+# also drops broken lines and non-tweet messages and counts them in the accumulators below.
+
+# The users partition index (Part 2) is built and shipped first: the preview samples users by group.
+from user_partition import index_from_pickle, index_files, shipped_index, PartitionIndex
+partition_prefix=index_from_pickle(args.partition)
+for f in index_files(partition_prefix):
+    sc.addFile(f)
+
+metrics.begin('parse')
+broken_lines = metrics.counter('broken_lines')
+non_tweets = metrics.counter('non_tweets')
+# Control messages and lines without "text" are dropped from the raw bytes, before decoding.
+skipped_lines = dict((name, metrics.counter('skipped_'+name)) for name in SKIPPED_TYPES)
+
+def parse_partition(lines):
+    return parse_tweets(prefilter(lines, skipped_lines), broken_lines, non_tweets)
+
+if args.parquet and args.dedup_retweets:
+    validtext=user_retweet_pairs(tweetsdf)
+elif args.parquet:
+    validtext=user_text_pairs(tweetsdf)
+elif args.entities:
+    # (user_id, [hashtag, mention and url domain tokens]) instead of the text (see entities.py).
+    from entities import entity_partition, entity_tokens
+    validtext=text.mapPartitions(lambda lines : entity_partition(prefilter(lines, skipped_lines), broken_lines, non_tweets))
+elif args.dedup_retweets:
+    # (user_id, (text, id of the retweeted tweet or None)), tokenized below (see retweets.py).
+    validtext=text.mapPartitions(lambda lines : parse_tweets(prefilter(lines, skipped_lines), broken_lines, non_tweets, with_extras=True)).map(lambda tw : (tw.user_id, (tw.text, tw.retweet_of)))
+else:
+    validtext=text.mapPartitions(parse_partition).map(lambda tw : (tw.user_id, tw.text))
+if args.preview:
+    # Only a sample of the users of every group goes on (see preview.py).
+    from preview import group_sizes, sampling_rates, sample_users, users_estimate, post_estimates, PreviewEstimate
+    rates=sampling_rates(group_sizes(PartitionIndex.load(partition_prefix, unassigned_group), args.num_groups),
+                         args.preview, args.preview_min_users)
+    validtext=validtext.mapPartitions(lambda pairs : sample_users(pairs, shipped_index(partition_prefix, unassigned_group), rates))
+
+# Tokenizing (Part 3) happens in the per-user pass below.
+# The tokenizer lives in happyfuntokenizing.py, next to this script. `FastTokenizer` gives the same
+# tokens as `Tokenizer(preserve_case=False)`, but caches repeated (retweet) texts and skips work
+# that cannot change the result; `tokenize_partition` runs one per partition.
+from happyfuntokenizing import FastTokenizer, tokenize_partition
+tok = FastTokenizer()
+# (partition index, (user, text) pairs) -> (user, tokens), optionally timing every tweet.
+tokenized=lambda pid,pairs : tokenize_partition(pairs)
+# With --entities the values already are tokens.
+if args.entities:
+    tokenized=lambda pid,pairs : pairs
+if args.tokenizer_histogram:
+    tokenized=timed_tokenize_partition(tokenize_partition, metrics.tokenizer_histograms())
+# The pass that tokenizes the texts also keeps the names of their tokens, one vocabulary per
+# partition (see token_ids.py), so no text is tokenized again to print them.
+from token_ids import named_token_ids, names_of, lookup_names
+
+if args.dedup_retweets:
+    # Each retweeted text is tokenized once, and the values become token id sets (see retweets.py).
+    from retweets import retweet_contents, popular_contents, tweet_token_ids, tokenize_originals
+    parsed=plan.persist('parsed',validtext)
+    contents=plan.persist('retweets',retweet_contents(parsed,tokenized))
+    # Every partition ends with the names of its tokens; kept (as 'retweets') until they are looked up.
+    retweetnames=names_of(contents)
+    contents=contents.filter(lambda (k,v) : k is not None)
+    # Both scan every retweet: remembered with the checkpoints, so a resumed run does not parse the input for them.
+    popular=sc.broadcast(ckpt.remember('popular_retweets_%d' % args.broadcast_retweets,lambda : popular_contents(contents,args.broadcast_retweets)))
+    distinct_count,retweet_count=ckpt.remember('retweet_counts',lambda : contents.values().map(lambda (ids,n) : (1,n)).fold((0,0),lambda (a,b),(c,d) : (a+c,b+d)))
+    print 'Tokenized %d distinct retweeted texts for %d retweets (%d broadcast)' % (distinct_count,retweet_count,len(popular.value))
+    validtext=tweet_token_ids(parsed,contents,popular)
+    # The originals are tokenized in the per-user pass, which passes the retweets' id sets on.
+    tokenized=lambda pid,pairs : tokenize_originals(pairs)
+    if args.tokenizer_histogram:
+        tokenized=timed_tokenize_partition(tokenize_originals, metrics.tokenizer_histograms())
+
+# The tweets are shuffled by user once; the unique users, the posts per group and the per-user
+# token sets all come out of one pass over that (see per_user.py). Heavy posters, estimated from
+# a sample of the input, are spread over several partitions (see skew.py).
+from skew import hot_keys
+from per_user import by_user, user_summaries, named_user_summaries, unique_users, user_posts, user_token_sets
+if args.parquet:
+    user_partitions=args.user_partitions or tweetsdf.rdd.getNumPartitions()
+else:
+    user_partitions=args.user_partitions or text.getNumPartitions()
+def sample_hot_users():
+    if args.parquet:
+        samplekeys=user_text_pairs(tweetsdf.sample(False,args.hot_sample,17)).keys()
+    else:
+        samplekeys=text.sample(False,args.hot_sample,17).mapPartitions(lambda lines : (tw.user_id for tw in parse_tweets(prefilter(lines))))
+    return hot_keys(samplekeys,args.hot_sample,user_partitions,args.hot_user_posts)
+# Remembered with the checkpoints, so a resumed run does not sample the raw input again.
+hot=ckpt.remember('hot_users',sample_hot_users) if args.salt_buckets>1 else {}
+if hot:
+    print 'Spreading the tweets of %d heavy posters over %d tasks' % (len(hot),args.salt_buckets)
+hotusers=sc.broadcast(set(hot))
+validtext=plan.persist('tweets',by_user(validtext,hotusers,args.salt_buckets,user_partitions))
+tweet_count=ckpt.remember('tweet_count',validtext.count)
+broken_count=ckpt.remember('broken_lines',lambda : broken_lines.value)
+non_tweet_count=ckpt.remember('non_tweets',lambda : non_tweets.value)
+skipped_counts=ckpt.remember('skipped',lambda : [(name, skipped_lines[name].value) for name in SKIPPED_TYPES])
+# validtext is materialized: the raw lines are not read again (until Part 4, with --window).
+if not args.window:
+    plan.release('raw')
+plan.release('parsed')
+metrics.end('parse', records_in=line_count, records_out=tweet_count,
+            broken_lines=broken_count, non_tweets=non_tweet_count, **dict(('skipped_'+name, n) for name, n in skipped_counts))
+
+# The per-user pass tokenizes the tweets and unions each user's token sets: a stage of its own.
+metrics.begin('users')
+if args.approx_users:
+    # No per-user token sets in approximate mode (see Part 3).
+    summaries=validtext.mapPartitions(lambda pairs : user_summaries((u,None) for u,t in pairs))
+else:
+    summaries=validtext.mapPartitionsWithIndex(lambda pid,pairs : named_user_summaries(tokenized(pid,pairs)))
+summaries=plan.persist('users',summaries)
+if not args.approx_users:
+    # Every partition ends with the names of its tokens; kept (as 'users') until they are looked up.
+    tokennames=names_of(summaries)
+    summaries=summaries.filter(lambda (u,s) : u is not None)
 
 # (2) Count the number of different users in all valid tweets (hint: [the `distinct()` method](https://spark.apache.org/docs/latest/programming-guide.html#transformations)).
 # 
@@ -94,10 +402,23 @@ validtext=text.filter(safe_parse).map(keypair).cache()
 # The number of unique users is: 2083
 # ```
 
-def print_users_count(count):
-    print 'The number of unique users is:', count
-
-print_users_count(validtext.map(lambda k : k[0]).distinct().count())
+if args.preview:
+    # Sampled users and posts of every group, with the squared posts, for the estimates and their intervals.
+    def group_post_stats(pairs):
+        index=shipped_index(partition_prefix, unassigned_group)
+        for u,n in pairs:
+            yield (index.lookup(u),(1,n,n*n))
+    stats=ckpt.remember('post_stats',lambda : user_posts(summaries,hotusers).mapPartitions(group_post_stats).reduceByKey(lambda (a,b,c),(d,e,f) : (a+d,b+e,c+f)).collectAsMap())
+    users_count=sum(n for n,posts,squares in stats.values())
+    print_users_estimate(*users_estimate(stats,rates))
+else:
+    users_count=ckpt.remember('users_count',lambda : unique_users(summaries,hotusers))
+    print_users_count(users_count)
+if not args.parquet:
+    print_dropped(broken_count, non_tweet_count, skipped_counts, json_backend)
+if args.preview:
+    print 'Preview: sampled %d users of groups %s at rates %s' % (users_count, range(args.num_groups), ', '.join('%.3f' % r for r in rates))
+metrics.end('users', records_in=tweet_count, records_out=users_count)
 #print_users_count(textdistinct.count())
 
 
@@ -107,22 +428,30 @@ print_users_count(validtext.map(lambda k : k[0]).distinct().count())
 # Note that the user partition we provide doesn't cover all users appear in the input data.
 # (1) Load the pickle file.
 
-# your code here
-import pickle
-partition=pickle.load(open("../Data/users-partition.pickle",'rb'))
+# The dictionary is converted once into sorted user id / group arrays (see user_partition.py).
+# The executors memory-map those files, so tasks no longer carry the whole dictionary.
+from collections import Counter
+metrics.begin('post_counts')
+# (loaded before Part 1, as partition_prefix)
 
 # (2) Count the number of posts from each user partition
 # Count the number of posts from group 0, 1, ..., 6, plus the number of posts from users who are not in any partition. Assign users who are not in any partition to the group 7.
 # Put the results of this step into a pair RDD `(group_id, count)` that is sorted by key.
 
 # your code here
-def usermapping((u,t)):
-    if u in partition:
-        return (partition[u],1)
-    else:
-        return (7,1)
-partmapped=validtext.map(usermapping)#.cache()
-sortedkeyrdd=partmapped.reduceByKey(lambda a,b:a+b).sortByKey('false')
+unpartitioned_posts = metrics.counter('unpartitioned_posts')
+
+userposts=user_posts(summaries,hotusers)
+
+def group_post_counts(pairs):
+    pairs=list(pairs)
+    groups=shipped_index(partition_prefix, unassigned_group).lookup_many([int(u) for u,n in pairs])
+    counts=Counter()
+    for g,(u,n) in zip(groups.tolist(),pairs):
+        counts[g]+=n
+    unpartitioned_posts.add(counts[unassigned_group])
+    return counts.items()
+sortedkeyrdd=userposts.mapPartitions(group_post_counts).reduceByKey(lambda a,b:a+b).sortByKey('false')
 
 
 # (3) Print the post count using the `print_post_count` function we provided.
@@ -140,11 +469,14 @@ sortedkeyrdd=partmapped.reduceByKey(lambda a,b:a+b).sortByKey('false')
 # Group 7 posted 798 tweets
 # ```
 
-def print_post_count(counts):
-    for group_id, count in counts:
-        print 'Group %d posted %d tweets' % (group_id, count)
-
-print_post_count(sortedkeyrdd.collect())
+post_counts=ckpt.remember('post_counts',sortedkeyrdd.collect)
+ckpt.save_summary()
+if args.preview:
+    # Estimated totals, from the per-group stats of Part 1.
+    print_post_estimates(post_estimates(stats,rates))
+else:
+    print_post_count(post_counts)
+metrics.end('post_counts', records_in=tweet_count, records_out=len(post_counts))
 # your code here
 
 
@@ -166,229 +498,15 @@ print_post_count(sortedkeyrdd.collect())
 # 
 # 
 # You can compute the relative popularity by calling the function `get_rel_popularity`.
+# Here it is computed for all groups and tokens at once by `PopularityMatrix.rel_popularity` (see popularity.py).
 
 # (0) Load the tweet tokenizer.
 
-# %load happyfuntokenizing.py
-#!/usr/bin/env python
-
-"""
-This code implements a basic, Twitter-aware tokenizer.
-
-A tokenizer is a function that splits a string of text into words. In
-Python terms, we map string and unicode objects into lists of unicode
-objects.
-
-There is not a single right way to do tokenizing. The best method
-depends on the application.  This tokenizer is designed to be flexible
-and this easy to adapt to new domains and tasks.  The basic logic is
-this:
-
-1. The tuple regex_strings defines a list of regular expression
-   strings.
-
-2. The regex_strings strings are put, in order, into a compiled
-   regular expression object called word_re.
-
-3. The tokenization is done by word_re.findall(s), where s is the
-   user-supplied string, inside the tokenize() method of the class
-   Tokenizer.
-
-4. When instantiating Tokenizer objects, there is a single option:
-   preserve_case.  By default, it is set to True. If it is set to
-   False, then the tokenizer will downcase everything except for
-   emoticons.
-
-The __main__ method illustrates by tokenizing a few examples.
-
-I've also included a Tokenizer method tokenize_random_tweet(). If the
-twitter library is installed (http://code.google.com/p/python-twitter/)
-and Twitter is cooperating, then it should tokenize a random
-English-language tweet.
-
-__author__ = "Christopher Potts"
-__version__ = "1.0"
-"""
-
-import re
-import htmlentitydefs
-
-# The following strings are components in the regular expression
-# that is used for tokenizing. It's important that phone_number
-# appears first in the final regex (since it can contain whitespace).
-# It also could matter that tags comes after emoticons, due to the
-# possibility of having text like
-#
-#     <:| and some text >:)
-#
-# Most imporatantly, the final element should always be last, since it
-# does a last ditch whitespace-based tokenization of whatever is left.
-
-# This particular element is used in a couple ways, so we define it
-# with a name:
-emoticon_string = r"""
-    (?:
-      [<>]?
-      [:;=8]                     # eyes
-      [\-o\*\']?                 # optional nose
-      [\)\]\(\[dDpP/\:\}\{@\|\\] # mouth      
-      |
-      [\)\]\(\[dDpP/\:\}\{@\|\\] # mouth
-      [\-o\*\']?                 # optional nose
-      [:;=8]                     # eyes
-      [<>]?
-    )"""
-
-# The components of the tokenizer:
-regex_strings = (
-    # Phone numbers:
-    r"""
-    (?:
-      (?:            # (international)
-        \+?[01]
-        [\-\s.]*
-      )?            
-      (?:            # (area code)
-        [\(]?
-        \d{3}
-        [\-\s.\)]*
-      )?    
-      \d{3}          # exchange
-      [\-\s.]*   
-      \d{4}          # base
-    )"""
-    ,
-    # URLs:
-    r"""http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+"""
-    ,
-    # Emoticons:
-    emoticon_string
-    ,    
-    # HTML tags:
-     r"""<[^>]+>"""
-    ,
-    # Twitter username:
-    r"""(?:@[\w_]+)"""
-    ,
-    # Twitter hashtags:
-    r"""(?:\#+[\w_]+[\w\'_\-]*[\w_]+)"""
-    ,
-    # Remaining word types:
-    r"""
-    (?:[a-z][a-z'\-_]+[a-z])       # Words with apostrophes or dashes.
-    |
-    (?:[+\-]?\d+[,/.:-]\d+[+\-]?)  # Numbers, including fractions, decimals.
-    |
-    (?:[\w_]+)                     # Words without apostrophes or dashes.
-    |
-    (?:\.(?:\s*\.){1,})            # Ellipsis dots. 
-    |
-    (?:\S)                         # Everything else that isn't whitespace.
-    """
-    )
-
-######################################################################
-# This is the core tokenizing regex:
-    
-word_re = re.compile(r"""(%s)""" % "|".join(regex_strings), re.VERBOSE | re.I | re.UNICODE)
-
-# The emoticon string gets its own regex so that we can preserve case for them as needed:
-emoticon_re = re.compile(regex_strings[1], re.VERBOSE | re.I | re.UNICODE)
-
-# These are for regularizing HTML entities to Unicode:
-html_entity_digit_re = re.compile(r"&#\d+;")
-html_entity_alpha_re = re.compile(r"&\w+;")
-amp = "&amp;"
-
-######################################################################
-
-class Tokenizer:
-    def __init__(self, preserve_case=False):
-        self.preserve_case = preserve_case
-
-    def tokenize(self, s):
-        """
-        Argument: s -- any string or unicode object
-        Value: a tokenize list of strings; conatenating this list returns the original string if preserve_case=False
-        """        
-        # Try to ensure unicode:
-        try:
-            s = unicode(s)
-        except UnicodeDecodeError:
-            s = str(s).encode('string_escape')
-            s = unicode(s)
-        # Fix HTML character entitites:
-        s = self.__html2unicode(s)
-        # Tokenize:
-        words = word_re.findall(s)
-        # Possible alter the case, but avoid changing emoticons like :D into :d:
-        if not self.preserve_case:            
-            words = map((lambda x : x if emoticon_re.search(x) else x.lower()), words)
-        return words
-
-    def tokenize_random_tweet(self):
-        """
-        If the twitter library is installed and a twitter connection
-        can be established, then tokenize a random tweet.
-        """
-        try:
-            import twitter
-        except ImportError:
-            print "Apologies. The random tweet functionality requires the Python twitter library: http://code.google.com/p/python-twitter/"
-        from random import shuffle
-        api = twitter.Api()
-        tweets = api.GetPublicTimeline()
-        if tweets:
-            for tweet in tweets:
-                if tweet.user.lang == 'en':            
-                    return self.tokenize(tweet.text)
-        else:
-            raise Exception("Apologies. I couldn't get Twitter to give me a public English-language tweet. Perhaps try again")
-
-    def __html2unicode(self, s):
-        """
-        Internal metod that seeks to replace all the HTML entities in
-        s with their corresponding unicode characters.
-        """
-        # First the digits:
-        ents = set(html_entity_digit_re.findall(s))
-        if len(ents) > 0:
-            for ent in ents:
-                entnum = ent[2:-1]
-                try:
-                    entnum = int(entnum)
-                    s = s.replace(ent, unichr(entnum))	
-                except:
-                    pass
-        # Now the alpha versions:
-        ents = set(html_entity_alpha_re.findall(s))
-        ents = filter((lambda x : x != amp), ents)
-        for ent in ents:
-            entname = ent[1:-1]
-            try:            
-                s = s.replace(ent, unichr(htmlentitydefs.name2codepoint[entname]))
-            except:
-                pass                    
-            s = s.replace(amp, " and ")
-        return s
+# (loaded in Part 1, as tok)
 
 from math import log
-
-tok = Tokenizer(preserve_case=False)
-
-def get_rel_popularity(c_k, c_all):
-    return log(1.0 * c_k / c_all) / log(2)
-
-
-def print_tokens(tokens, gid = None):
-    group_name = "overall"
-    if gid is not None:
-        group_name = "group %d" % gid
-    print '=' * 5 + ' ' + group_name + ' ' + '=' * 5
-    for t, n in tokens:
-        print "%s\t%.4f" % (t, n)
-    print
-
+from popularity import PopularityMatrix, count_vector
+from hyperloglog import HyperLogLog, hash64, relative_error
 
 # (1) Tokenize the tweets using the tokenizer we provided above named `tok`. Count the number of mentions for each tokens regardless of specific user group.
 # 
@@ -408,14 +526,57 @@ def print_tokens(tokens, gid = None):
 #print len(a)
 
 
-def usermapping2(u):
-    if u in partition:
-        return partition[u]
-    else:
-        return 7
-    
-v1=validtext.mapValues(lambda t : set(tok.tokenize(t))).reduceByKey(lambda t,t1 : t.union(t1)).map(lambda (u,t) : (usermapping2(u),list(t))).flatMapValues(lambda t : t).cache()
-print_count(v1.map(lambda (u,t): t ).distinct())
+metrics.begin('tokens')
+
+def usermapping2((u,b)):
+    g=shipped_index(partition_prefix, unassigned_group).lookup(u)
+    if g==unassigned_group and b==0:
+        unpartitioned_users.add(1)
+    return g
+
+# Tokens are encoded as 64-bit ids (see token_ids.py), so the shuffles and caches below move ints instead of strings.
+# One pass counts, for every token, the users of each group that mentioned it.
+if args.approx_users:
+    # Approximate mode: a small HyperLogLog sketch of user ids per (group, token), so no user's
+    # full token set is ever materialized (see hyperloglog.py).
+    def user_sketches(pid, pairs):
+        index=shipped_index(partition_prefix, unassigned_group)
+        vocabulary={}
+        for u,ids in named_token_ids(tokenized(pid, pairs), vocabulary):
+            g=index.lookup(u)
+            h=hash64(u)
+            for i in ids:
+                yield ((g,i),h)
+        # The names ride along in the same shuffle, as group None.
+        for t,i in vocabulary.iteritems():
+            yield ((None,i),t)
+    def sketch_or_name():
+        # combineByKey functions: a sketch of the user hashes, or the name of the token as it is.
+        def create(v):
+            return v if isinstance(v,basestring) else HyperLogLog(args.hll_precision).add_hash(v)
+        def add(s,h):
+            return s if isinstance(s,basestring) else s.add_hash(h)
+        def merge(s,s1):
+            return s if isinstance(s,basestring) else s.merge(s1)
+        return create,add,merge
+    sketches=validtext.mapPartitionsWithIndex(user_sketches).combineByKey(*sketch_or_name())
+    def approx_counts():
+        counted=sketches.filter(lambda ((g,t),s) : g is not None)
+        return counted.map(lambda ((g,t),s) : (t,(g,int(round(s.count()))))).combineByKey(*count_vector(args.num_groups))
+    tokencounts=ckpt.rdd('token_counts',approx_counts)
+    # Read back from the shuffle output of the sketches: nothing is parsed or tokenized again.
+    tokennames=sketches.filter(lambda ((g,t),s) : g is None).map(lambda ((g,t),name) : (t,name))
+else:
+    unpartitioned_users = metrics.counter('unpartitioned_users')
+    def exact_counts():
+        # The per-user token sets come from the per-user pass of Part 1 (see per_user.py).
+        usertokens=ckpt.rdd('user_tokens',lambda : user_token_sets(summaries,hotusers,args.salt_buckets))
+        v1=usertokens.map(lambda (u,t) : (usermapping2(u),t)).flatMapValues(lambda t : t)
+        return v1.map(lambda (g,t) : (t,(g,1))).combineByKey(*count_vector(args.num_groups))
+    tokencounts=ckpt.rdd('token_counts',exact_counts)
+plan.persist('counts',tokencounts)
+token_count=print_count(tokencounts)
+metrics.end('tokens', records_in=tweet_count, records_out=token_count)
 #combineByKey((lambda t : tok.tokenize(t)),(lambda acc, value: acc.(value)),(lambda acc1, acc2: acc1.extend(acc2) )).flatMap(lambda (u,t) : t).distinct().count()
 #.flatMapValues(lambda t : list(t))
 
@@ -465,9 +626,48 @@ print_count(v1.map(lambda (u,t): t ).distinct())
 #print_count(ordered_tokens)
 #print_tokens(ordered_tokens.takeOrdered(20,key = lambda x: -x[1]))
 
-v2=v1.map(lambda (t,u) : (u,1)).reduceByKey(lambda a,b : a+b).filter(lambda (t,ul) : ul>=100).cache()
-print_count(v2)
-print_tokens(v2.takeOrdered(20,key = lambda x: -x[1]))
+# The counts are collected into a groups x tokens matrix; the threshold, the ratios and the
+# top-k below are array operations on the driver (see popularity.py).
+metrics.begin('rank')
+min_users_floor=args.min_users_floor
+if args.preview:
+    # An estimate reaches --min-users only if the sampled count reaches it times the lowest rate.
+    min_users_floor=max(1,min(min_users_floor,int(args.min_users*min(rates))))
+matrix=PopularityMatrix.from_rows(tokencounts.filter(lambda (t,c) : sum(c)>=min_users_floor).collect(),args.num_groups)
+plan.release('counts')
+if args.preview:
+    # Counts scaled up by the sampling rates; the threshold applies to the estimates.
+    estimate=PreviewEstimate(matrix,rates).frequent(args.min_users)
+    v2=estimate.estimate
+else:
+    v2=matrix.frequent(args.min_users)
+print 'Number of elements:', len(v2)
+# Only the ids that survive the filter are mapped back to their strings (all collected ids with --index-out).
+named=matrix if args.index_out else v2
+if args.dedup_retweets:
+    tokennames=tokennames.union(retweetnames)
+if ckpt.enabled:
+    tokennames=ckpt.rdd('token_names',lambda : tokennames.reduceByKey(lambda a,b : a))
+names=lookup_names(tokennames,named.token_ids.tolist())
+plan.release('users')
+plan.release('retweets')
+if args.index_out:
+    from count_index import write_count_index
+    # Only the tokens of at least min_users_floor users were collected: the server refuses lower thresholds.
+    write_count_index(args.index_out,matrix,names,min_users_floor)
+    print 'Wrote the user counts of %d tokens (of at least %d users) to %s' % (len(matrix),min_users_floor,args.index_out)
+plan.release('tweets')
+if args.approx_users:
+    rse=relative_error(args.hll_precision)
+    print_token_bounds(v2.top_overall(names,20),rse)
+    # log2 of a ratio of two estimates, each within about rse.
+    print 'Relative popularities below are accurate to about +/- %.4f' % (rse * 2 ** 0.5 / log(2))
+    print
+elif args.preview:
+    print_token_intervals(estimate.top_overall(names,20))
+    print
+else:
+    print_tokens(v2.top_overall(names,20))
 
 
 # (3) For all tokens that are mentioned by at least 100 users, compute their relative popularity in each user group. Then print the top 10 tokens with highest relative popularity in each user group. In case two tokens have same relative popularity, break the tie by printing the alphabetically smaller one.
@@ -573,59 +773,35 @@ print_tokens(v2.takeOrdered(20,key = lambda x: -x[1]))
 # i	-1.2996
 # ```
 
-def popfn((t,c)):
-    #tmp=0
-    #if u[1][0]>0:
-    tmp=get_rel_popularity(c,ordt[t])
-    return ((-tmp,t),tmp)
-
 #def tokenprint(par_text,it):
 #    p1=par_text.join(ordered_tokens).map(popfn).sortByKey().map(lambda (u,v) : (u[1],v)).take(10)
 #    print_tokens(p1,it)
 #    return p1
 
-ordt=v2.collectAsMap()
-#[r[0] for r in v2.collect()]
-v3=v1.filter(lambda (p,t) : t in ordt).cache()
+toppop=v2.top_k(names,args.top_k)
 
-bm=-100
-cm=-100
-dm=-100
-bg=7
-cg=7
-dg=7    
+if args.preview:
+    intervals,overlaps=estimate.top_k(names,args.top_k,args.preview_rounds)
+    for it in range(0,args.num_groups):
+        print_token_intervals(intervals[it],it)
+        print_stability(overlaps[it],args.top_k)
+else:
+    for it in range(0,args.num_groups):
+        print_tokens(toppop[it],it)
 
-for it in range(0,8):
-    p1=v3.filter(lambda (p,t) : p==it).map(lambda (p,t) : (t,1)).reduceByKey(lambda a,b : a+b).map(popfn).sortByKey().map(lambda (u,v) : (u[1],v)).take(10)
-    print_tokens(p1,it)
-    
-    if it!=7:
-        for t,m in p1:
-            if "bernie" in t and m>bm:
-                bm=m
-                bg=it
-            if "sanders" in t and m>bm:
-                bm=m
-                bg=it
-            if "ted" in t and m>cm:
-                cm=m
-                cg=it
-            if "cruz" in t and m>cm:
-                cm=m
-                cg=it  
-            if "donald" in t and m>dm:
-                dm=m
-                dg=it
-            if "trump" in t and m>dm:
-                dm=m
-                dg=it
+# Every frequent token that names a candidate counts, not only the printed top-k (see affinity.py).
+from affinity import CandidateAffinity
+affinity=CandidateAffinity(v2,names,candidates)
+leaders=affinity.leaders(unassigned_group)
+print_affinity(affinity.candidates,affinity.affinity,leaders)
+metrics.end('rank', records_in=token_count, records_out=len(v2), below_min_users=token_count-len(v2))
 
 
 #od2=od1.filter(lambda (t,u) : t in ordt).mapValues(lambda x : filter(lambda a : a in partition,x)).cache()
 
 #for it in range(0,7):
 #    pt=tokenprint(od2.mapValues(lambda x:len(set(filter(lambda l : partition[l]==it,x)))).filter(lambda (u,v) : v>0),it)
-    '''for t,m in pt:
+'''for t,m in pt:
         if t=="bernie" and m>bm:
             bm=m
             bg=it
@@ -656,11 +832,81 @@ for it in range(0,8):
 # If your program looks okay on the local test data, you can try it on the larger input by submitting your program to the homework server. Observe the output of your program to larger input files, can you guess the partition IDs of the three groups mentioned above based on your output?
 
 # Change the values of the following three items to your guesses
-users_support = [
-    (bg, "Bernie Sanders"),
-    (cg, "Ted Cruz"),
-    (dg, "Donald Trump")
-]
-
-for gid, candidate in users_support:
-    print "Users from group %d are most likely to support %s." % (gid, candidate)
+users_support = [(g, name) for (g, margin), name in zip(leaders, affinity.candidates)]
+
+print_supporters(users_support)
+
+
+# # Part 4: Relative popularity per time window
+# 
+# With --window, the same ranking per group for every time window. One pass collects the panes
+# (see windows.py) in which each user mentioned each token; every window then counts the users
+# with a pane inside it, so overlapping windows share the scan.
+
+if args.window:
+    metrics.begin('windows')
+    from tweet_parser import parse_created_at
+    from windows import pane_sets
+    # Tweets without a created_at, or with one that does not parse, are left out of the windows and counted.
+    untimed_tweets=metrics.counter('untimed_tweets')
+    if args.parquet:
+        def timed_rows(rows):
+            for r in rows:
+                if r.created_at is None:
+                    untimed_tweets.add(1)
+                    continue
+                yield ((str(r.user_id),wins.pane_of(r.created_at)),r.text.encode('utf-8'))
+        timedtext=load_tweets(sqlContext,args.parquet,columns=('user_id','created_at','text'),since=args.since,until=args.until,user_ids=user_ids).rdd.mapPartitions(timed_rows)
+    else:
+        def timed_partition(lines):
+            for tw in parse_tweets(prefilter(lines), with_extras=True):
+                try:
+                    pane=wins.pane_of(parse_created_at(tw.created_at))
+                except ValueError:
+                    untimed_tweets.add(1)
+                    continue
+                yield ((tw.user_id, pane), entity_tokens(tw.entities) if args.entities else tw.text)
+        timedtext=text.mapPartitions(timed_partition)
+
+    def window_cells(pairs):
+        index=shipped_index(partition_prefix, unassigned_group)
+        for (u,i),panes in pairs:
+            if u is None:
+                continue
+            g=index.lookup(u)
+            for w in wins.windows_of_panes(panes):
+                yield ((w,i),(g,1))
+    windowtokens=timedtext if args.entities else timedtext.mapPartitions(tokenize_partition)
+    def pane_records(pairs):
+        vocabulary={}
+        for (u,p),ids in named_token_ids(pairs, vocabulary):
+            for i in ids:
+                yield ((u,i),p)
+        # The names ride along in the same shuffle, as user None: a set of the one name.
+        for t,i in vocabulary.iteritems():
+            yield ((None,i),t)
+    panes=windowtokens.mapPartitions(pane_records).combineByKey(*pane_sets())
+    windowcounts=panes.mapPartitions(window_cells).combineByKey(*count_vector(args.num_groups)).filter(lambda (k,c) : sum(c)>=args.window_min_users).collect()
+
+    rows={}
+    for (w,i),c in windowcounts:
+        rows.setdefault(w,[]).append((i,c))
+    # Read back from the shuffle output of the panes: nothing is parsed or tokenized again.
+    window_names=lookup_names(panes.filter(lambda ((u,i),s) : u is None).map(lambda ((u,i),s) : (i,next(iter(s)))),
+                              set(i for (w,i),c in windowcounts))
+    plan.release('raw')
+    for w in sorted(rows):
+        wm=PopularityMatrix.from_rows(rows[w],args.num_groups)
+        print_window(wins.label(w),len(wm))
+        tops=wm.top_k(window_names,args.top_k)
+        for it in range(0,args.num_groups):
+            print_tokens(tops[it],it)
+    if untimed_tweets.value:
+        print 'Left %d tweets without a valid created_at out of the windows' % untimed_tweets.value
+    metrics.end('windows', records_in=tweet_count, records_out=len(rows), untimed_tweets=untimed_tweets.value)
+
+if ckpt.resumed:
+    print 'Reused checkpoints of %s from %s' % (', '.join(ckpt.resumed), ckpt.path)
+if args.metrics_out:
+    metrics.write(args.metrics_out)
+    print 'Metrics written to %s' % args.metrics_out
@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Compact, memory-mappable user -> partition index.
+
+The users partition ships as a pickled `{user_id: partition_id}` dict, which
+is large to pickle into every task and slow to hash into. Here it is stored
+as two parallel arrays on disk: sorted int64 user ids and uint8 partition
+ids. Lookups are a binary search (`numpy.searchsorted`), either one user at
+a time or vectorized over a whole partition of records.
+
+On a cluster the two .npy files are distributed with `SparkContext.addFile`
+and every executor process maps them once (see `shipped_index`), so tasks
+only carry the file name.
+"""
+
+import os
+import pickle
+
+import numpy as np
+
+# Users who are not in any partition are assigned to this group.
+UNASSIGNED_GROUP = 7
+
+
+def index_files(prefix):
+    return prefix + '.ids.npy', prefix + '.groups.npy'
+
+
+def build_index(partition, prefix):
+    """
+    Write the sorted id / group arrays for the dict `partition` next to `prefix`.
+    """
+    ids = np.fromiter((int(u) for u in partition), dtype=np.int64, count=len(partition))
+    groups = np.fromiter((partition[u] for u in partition), dtype=np.uint8, count=len(partition))
+    order = np.argsort(ids, kind='mergesort')
+    ids_path, groups_path = index_files(prefix)
+    np.save(ids_path, ids[order])
+    np.save(groups_path, groups[order])
+
+
+def index_from_pickle(pickle_path):
+    """
+    Build the index for `pickle_path` unless an up-to-date one exists.
+    Value: the index prefix
+    """
+    prefix = os.path.splitext(pickle_path)[0]
+    mtime = os.path.getmtime(pickle_path)
+    if not all(os.path.exists(f) and os.path.getmtime(f) >= mtime for f in index_files(prefix)):
+        with open(pickle_path, 'rb') as f:
+            build_index(pickle.load(f), prefix)
+    return prefix
+
+
+class PartitionIndex(object):
+    def __init__(self, ids, groups, default=UNASSIGNED_GROUP):
+        self.ids = ids
+        self.groups = groups
+        self.default = default
+
+    @classmethod
+    def load(cls, prefix, default=UNASSIGNED_GROUP, mmap=True):
+        ids_path, groups_path = index_files(prefix)
+        mode = 'r' if mmap else None
+        return cls(np.load(ids_path, mmap_mode=mode), np.load(groups_path, mmap_mode=mode), default)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def lookup(self, user_id):
+        """
+        Argument: user_id -- user id as a string or integer
+        Value: the partition id of the user, or the default group
+        """
+        try:
+            uid = int(user_id)
+        except ValueError:
+            return self.default
+        pos = np.searchsorted(self.ids, uid)
+        if pos < len(self.ids) and self.ids[pos] == uid:
+            return int(self.groups[pos])
+        return self.default
+
+    def lookup_many(self, user_ids):
+        """
+        Vectorized lookup of a sequence of numeric user ids.
+        Value: uint8 array of partition ids
+        """
+        uids = np.asarray(user_ids, dtype=np.int64)
+        if len(self.ids) == 0:
+            return np.full(len(uids), self.default, dtype=np.uint8)
+        pos = np.searchsorted(self.ids, uids)
+        pos[pos == len(self.ids)] = 0
+        return np.where(self.ids[pos] == uids, self.groups[pos], self.default).astype(np.uint8)
+
+
+_shipped = {}
+
+
+def shipped_index(prefix, default=UNASSIGNED_GROUP):
+    """
+    Per-process cache of an index distributed with `SparkContext.addFile`.
+    """
+    key = (prefix, default)
+    if key not in _shipped:
+        from pyspark import SparkFiles
+        name = os.path.basename(prefix)
+        _shipped[key] = PartitionIndex.load(os.path.join(SparkFiles.getRootDirectory(), name), default)
+    return _shipped[key]
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# __author__ = Srinath Narayanan
+
+"""
+Relative popularity per time window (tumbling or sliding).
+
+Time is cut into panes of gcd(window, slide) seconds, aligned to the epoch,
+so every window is a whole number of consecutive panes. The corpus is
+scanned once to collect, for every (user, token), the set of panes in which
+that user mentioned the token. Each window then counts that user once for
+the token if any of those panes falls inside it. Adjacent windows share
+the per-pane work instead of each rescanning the tweets, and a user who
+mentions a token in several panes of the same window is still counted once.
+"""
+
+import time
+from fractions import gcd
+
+_units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400, 'w': 7 * 86400}
+
+
+def parse_duration(text):
+    """
+    Argument: text -- a duration such as '90', '30m', '1h' or '7d'
+    Value: seconds
+    """
+    text = text.strip().lower()
+    try:
+        if text[-1:] in _units:
+            seconds = int(text[:-1]) * _units[text[-1]]
+        else:
+            seconds = int(text)
+    except ValueError:
+        raise ValueError('not a duration: %r' % text)
+    if seconds <= 0:
+        raise ValueError('duration must be positive: %r' % text)
+    return seconds
+
+
+class Windows(object):
+    """
+    Argument: size -- window length in seconds
+              slide -- seconds between window starts (size for tumbling windows)
+
+    Window j covers [j * slide, j * slide + size).
+    """
+    def __init__(self, size, slide=None):
+        self.size = size
+        self.slide = slide or size
+        self.pane = gcd(self.size, self.slide)
+
+    def pane_of(self, timestamp):
+        return timestamp // self.pane
+
+    def windows_of_panes(self, panes):
+        """
+        Argument: panes -- collection of pane numbers
+        Value: sorted list of the windows containing at least one of them
+        """
+        windows = []
+        last = None
+        for p in sorted(panes):
+            t = p * self.pane
+            first = (t - self.size) // self.slide + 1
+            if last is not None and first <= last:
+                first = last + 1
+            last = t // self.slide
+            windows.extend(range(first, last + 1))
+        return windows
+
+    def bounds(self, window):
+        """
+        Value: (start, end) of the window, in seconds since the epoch
+        """
+        start = window * self.slide
+        return start, start + self.size
+
+    def label(self, window):
+        start, end = self.bounds(window)
+        fmt = '%Y-%m-%d %H:%M' if self.pane % 60 == 0 else '%Y-%m-%d %H:%M:%S'
+        return '%s - %s UTC' % (time.strftime(fmt, time.gmtime(start)), time.strftime(fmt, time.gmtime(end)))
+
+
+def pane_sets():
+    """
+    combineByKey functions that collect the panes of every key into a set,
+    updated in place.
+    """
+    def create(pane):
+        return set([pane])
+
+    def add(panes, pane):
+        panes.add(pane)
+        return panes
+
+    def merge(panes, other):
+        panes |= other
+        return panes
+
+    return create, add, merge